@@ -0,0 +1,68 @@
+import json
+
+
+class CardSnapshot:
+    """
+    Momentopname van alles wat de Hackbat over de huidige kaart weet, met een
+    versienummer dat bij elke wijziging ophoogt. De NFC-kant vult hem (detectie,
+    dump, opgevangen authenticaties, gevonden sleutel); de webserver leest alleen
+    en krijgt per versie gecachte JSON en HTML, zonder de PN532 aan te raken.
+    """
+    __slots__ = ("version", "card", "dump", "mfkey32", "mfkey64", "key", "_json", "_table")
+
+    def __init__(self):
+        self.version = 0
+        self.card = None     # {"uid", "atqa", "sak", "type"}
+        self.dump = None     # CardImage van de laatste dump
+        self.mfkey32 = None  # Opgevangen nonces voor mfkey32 (dict met hex-strings)
+        self.mfkey64 = None  # Opgevangen volledige authenticatie voor mfkey64
+        self.key = None      # Resultaat van de laatste sleutelberekening
+        self._json = None
+        self._table = None
+
+    def update(self, **fields):
+        for name, value in fields.items():
+            setattr(self, name, value)
+        self.version += 1
+        self._json = None
+        self._table = None
+
+    def clear(self):
+        self.update(card=None, dump=None, mfkey32=None, mfkey64=None, key=None)
+
+    def etag(self):
+        return '"v{}"'.format(self.version)
+
+    def json(self):
+        """De hele snapshot als JSON-bytes; één keer per versie opgebouwd."""
+        if self._json is None:
+            # De dump schrijft zijn eigen JSON rechtstreeks uit de kaartbuffer
+            dump = self.dump.json() if self.dump is not None else b"null"
+            self._json = b"".join((
+                json.dumps({"version": self.version, "card": self.card}).encode()[:-1],
+                b', "dump": ', dump,
+                b", ", json.dumps({"mfkey32": self.mfkey32, "mfkey64": self.mfkey64, "key": self.key}).encode()[1:],
+            ))
+        return self._json
+
+    def mfkey32_table(self):
+        """
+        De opgevangen mfkey32-data als HTML-tabel (uid, nt, nr0, ar0, nt1, nr1, ar1).
+        """
+        if self._table is None:
+            data = self.mfkey32
+            if data is None:
+                self._table = "<p>Geen kaartdata beschikbaar.</p>"
+            else:
+                html = "<table>"
+                html += "<tr><th>Parameter</th><th>Waarde</th></tr>"
+                html += f"<tr><td>UID</td><td>{data.get('uid','')}</td></tr>"
+                html += f"<tr><td>NT</td><td>{data.get('nt','')}</td></tr>"
+                html += f"<tr><td>NR0</td><td>{data.get('nr0','')}</td></tr>"
+                html += f"<tr><td>AR0</td><td>{data.get('ar0','')}</td></tr>"
+                html += f"<tr><td>NT1</td><td>{data.get('nt1','')}</td></tr>"
+                html += f"<tr><td>NR1</td><td>{data.get('nr1','')}</td></tr>"
+                html += f"<tr><td>AR1</td><td>{data.get('ar1','')}</td></tr>"
+                html += "</table>"
+                self._table = html
+        return self._table
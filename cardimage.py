@@ -0,0 +1,208 @@
+"""
+Geheugenbeeld van een MIFARE Classic kaart.
+
+Alle blokken staan in één aaneengesloten buffer (1 KB of 4 KB); een bitmap houdt
+bij welke blokken gelezen zijn en een tweede welke sleutels (A/B per sector)
+bekend zijn. Blokken worden als memoryview uitgegeven, zonder kopie, en de
+serialisatie (hex, JSON, binair) leest rechtstreeks uit de buffer.
+"""
+
+import binascii
+import mifare
+
+_KEY_LEN = 6
+_MAGIC = b"HBD1"  # Opslagformaat van write_to/read_from
+
+
+def _get_bit(bitmap, n):
+    return bitmap[n >> 3] >> (n & 7) & 1
+
+
+def _set_bit(bitmap, n, value=True):
+    if value:
+        bitmap[n >> 3] |= 1 << (n & 7)
+    else:
+        bitmap[n >> 3] &= ~(1 << (n & 7)) & 0xFF
+
+
+class CardImage:
+    __slots__ = ("uid", "sak", "atqa", "block_count", "sector_count", "stats", "_buf", "_view",
+                 "_valid", "_keys", "_known", "_loaded")
+
+    def __init__(self, uid, sak=mifare.SAK_CLASSIC_1K, atqa=None):
+        self.uid = bytes(uid)
+        self.sak = sak
+        self.atqa = bytes(atqa) if atqa is not None else None
+        self.block_count = mifare.total_blocks(sak)
+        self.sector_count = mifare.sector_count(sak)
+        self.stats = None  # {"blocks", "ms", "blocks_per_s"} over alle leesrondes samen (add_stats)
+        self._buf = bytearray(self.block_count * mifare.BLOCK_SIZE)
+        self._view = memoryview(self._buf)
+        self._valid = bytearray((self.block_count + 7) // 8)
+        self._keys = bytearray(self.sector_count * 2 * _KEY_LEN)  # Per sector key A, dan key B
+        self._known = bytearray((self.sector_count * 2 + 7) // 8)
+        self._loaded = bytearray((self.sector_count + 7) // 8)  # Sectoren die al geprobeerd zijn
+
+    # -------------------- Blokken --------------------
+
+    def view(self, block):
+        """Schrijfbare view op de 16 bytes van een blok, ongeacht of het gelezen is."""
+        start = block * mifare.BLOCK_SIZE
+        return self._view[start:start + mifare.BLOCK_SIZE]
+
+    def block(self, block):
+        """View op een gelezen blok, of None als het (nog) niet gelezen is."""
+        return self.view(block) if _get_bit(self._valid, block) else None
+
+    def mark_valid(self, block, valid=True):
+        """Voor blokken die via view() direct in de buffer gelezen zijn."""
+        _set_bit(self._valid, block, valid)
+
+    def blocks_read(self, sector=None):
+        """Aantal gelezen blokken, van de hele kaart of van één sector."""
+        if sector is None:
+            blocks = range(self.block_count)
+        else:
+            first = mifare.first_block(sector)
+            blocks = range(first, first + mifare.block_count(sector))
+        return sum(_get_bit(self._valid, n) for n in blocks)
+
+    def add_stats(self, blocks, ms):
+        """Tel een leesronde (blokken, ms) op bij de statistiek."""
+        if self.stats is not None:
+            blocks += self.stats["blocks"]
+            ms += self.stats["ms"]
+        self.stats = {"blocks": blocks, "ms": ms, "blocks_per_s": blocks * 1000 // ms if ms else blocks}
+
+    # -------------------- Sectoren --------------------
+
+    def mark_loaded(self, sector, loaded=True):
+        _set_bit(self._loaded, sector, loaded)
+
+    def missing_sectors(self, sectors=None):
+        """De sectoren (standaard alle) die nog niet geladen zijn."""
+        if sectors is None:
+            sectors = range(self.sector_count)
+        return [s for s in sectors if 0 <= s < self.sector_count and not _get_bit(self._loaded, s)]
+
+    def complete(self):
+        return not self.missing_sectors()
+
+    def copy(self, keep_loaded=True):
+        """
+        Kopie van het beeld. Met keep_loaded=False wordt elke sector opnieuw
+        gelezen, maar blijft de oude inhoud staan tot hij overschreven wordt.
+        """
+        image = CardImage(self.uid, self.sak, self.atqa)
+        image.stats = self.stats if keep_loaded else None  # Opnieuw lezen: nieuwe meting
+        for name in ("_buf", "_valid", "_keys", "_known", "_loaded"):
+            getattr(image, name)[:] = getattr(self, name)
+        if not keep_loaded:
+            image._loaded[:] = bytes(len(image._loaded))
+        return image
+
+    # -------------------- Sleutels --------------------
+
+    def _key_slot(self, sector, key_type):
+        return sector * 2 + (1 if key_type == mifare.KEY_B else 0)
+
+    def set_key(self, sector, key_type, key):
+        slot = self._key_slot(sector, key_type)
+        self._keys[slot * _KEY_LEN:(slot + 1) * _KEY_LEN] = key
+        _set_bit(self._known, slot)
+
+    def key(self, sector, key_type):
+        """View op de bekende sleutel (6 bytes), of None."""
+        slot = self._key_slot(sector, key_type)
+        if not _get_bit(self._known, slot):
+            return None
+        return memoryview(self._keys)[slot * _KEY_LEN:(slot + 1) * _KEY_LEN]
+
+    def sector_key(self, sector):
+        """(key_type, sleutel) waarmee de sector open ging, key A eerst; of None."""
+        for key_type in (mifare.KEY_A, mifare.KEY_B):
+            key = self.key(sector, key_type)
+            if key is not None:
+                return key_type, key
+        return None
+
+    # -------------------- Serialisatie --------------------
+
+    def record_size(self):
+        """Aantal bytes dat write_to schrijft."""
+        return (len(_MAGIC) + 1 + len(self.uid) + 3 + len(self._valid) + len(self._known)
+                + len(self._keys) + len(self._buf))
+
+    def crc(self):
+        """CRC over blokken, bitmaps en sleutels: verandert alleen als de dump inhoudelijk verandert."""
+        crc = 0
+        for buf in (self._valid, self._known, self._keys, self._buf):
+            crc = binascii.crc32(buf, crc)
+        return crc
+
+    def write_to(self, f):
+        """
+        Schrijf het beeld naar een (binair) bestand: kop, bitmaps, sleutels en
+        de blokbuffer, elk met één write direct uit het geheugen.
+        """
+        atqa = self.atqa if self.atqa is not None else b"\x00\x00"
+        f.write(_MAGIC + bytes((len(self.uid),)) + self.uid + bytes((self.sak,)) + atqa[:2])
+        f.write(self._valid)
+        f.write(self._known)
+        f.write(self._keys)
+        f.write(self._buf)
+
+    @classmethod
+    def read_from(cls, f):
+        """Lees een met write_to geschreven beeld; None als het bestand niet klopt."""
+        head = f.read(5)
+        if len(head) != 5 or head[:4] != _MAGIC:
+            return None
+        uid = f.read(head[4])
+        rest = f.read(3)
+        if len(uid) != head[4] or len(rest) != 3:
+            return None
+        image = cls(uid, rest[0], rest[1:3])
+        for buf in (image._valid, image._known, image._keys, image._buf):
+            if f.readinto(buf) != len(buf):
+                return None
+        # Sectoren zonder bekende sleutel worden bij gebruik opnieuw geprobeerd
+        for sector in range(image.sector_count):
+            if image.sector_key(sector) is not None:
+                image.mark_loaded(sector)
+        return image
+
+    def hex_block(self, block):
+        """Hex-bytes van een gelezen blok, of None."""
+        data = self.block(block)
+        return None if data is None else binascii.hexlify(data)
+
+    def json_chunks(self):
+        """
+        JSON van de dump in stukken, direct uit de buffer:
+        {"uid", "sectors": {"<n>": {"blocks", "key_type", "key"}}, "stats"}.
+        Alleen sectoren waarvan een sleutel bekend is staan erin.
+        """
+        yield b'{"uid": "' + binascii.hexlify(self.uid) + b'", "sectors": {'
+        first = True
+        for sector in range(self.sector_count):
+            found = self.sector_key(sector)
+            if found is None:
+                continue
+            yield b'"%d": {"blocks": [' % sector if first else b', "%d": {"blocks": [' % sector
+            first = False
+            start = mifare.first_block(sector)
+            for n in range(start, start + mifare.block_count(sector)):
+                data = self.hex_block(n)
+                sep = b", " if n > start else b""
+                yield sep + (b"null" if data is None else b'"' + data + b'"')
+            yield b'], "key_type": "%s", "key": "' % (b"A" if found[0] == mifare.KEY_A else b"B")
+            yield binascii.hexlify(found[1]) + b'"}'
+        if self.stats is None:
+            yield b'}, "stats": null}'
+        else:
+            yield b'}, "stats": {"blocks": %d, "ms": %d, "blocks_per_s": %d}}' % (
+                self.stats["blocks"], self.stats["ms"], self.stats["blocks_per_s"])
+
+    def json(self):
+        return b"".join(self.json_chunks())
@@ -0,0 +1,599 @@
+"""
+crypto1
+====================================================
+
+Crypto1 (MIFARE Classic) cipher met LFSR-rollback en mfkey32/mfkey64 sleutelherstel.
+Gebaseerd op crapto1 van bla <blapost@gmail.com>, herschreven zodat het zowel
+op MicroPython (Hackbat) als op CPython (testen op de laptop) draait.
+
+Kandidaatlijsten worden in array('I') bewaard in plaats van lijsten met ints,
+en de zoekruimte wordt in rondes opgeknipt zodat het geheugengebruik binnen
+een opgegeven budget blijft. Per ronde wordt elke LFSR-helft één keer opgebouwd.
+"""
+
+from array import array
+
+try:
+    from micropython import const
+except ImportError:  # CPython
+    def const(x):
+        return x
+
+try:
+    from gc import collect, mem_free
+except ImportError:  # CPython
+    mem_free = None
+
+LF_POLY_ODD = const(0x29CE5C)
+LF_POLY_EVEN = const(0x870804)
+
+_MASK24 = const(0xFFFFFF)
+_MASK32 = const(0xFFFFFFFF)
+
+# Het filter bestaat uit vijf 4-bit functies (fa/fb) en een 5-bit functie (fc).
+# _FILTER_LO bevat de uitkomst voor nibbles 0-1, _FILTER_HI voor nibbles 2-4,
+# zodat filter() maar twee tabel-lookups kost.
+_FA_FB = (0xF22C0, 0x6C9C0, 0x3C8B0, 0x1E458, 0x0D938)
+_FC = const(0xEC57E80A)
+
+
+def _nibble_bits(x, first, count):
+    f = 0
+    for i in range(count):
+        n = first + i
+        f |= _FA_FB[n] >> (x >> (4 * i) & 0xF) & (16 >> n)
+    return f
+
+
+_FILTER_LO = bytes(_nibble_bits(x, 0, 2) for x in range(1 << 8))
+_FILTER_HI = bytes(_nibble_bits(x, 2, 3) for x in range(1 << 12))
+_PARITY = bytes(bin(x).count("1") & 1 for x in range(256))
+
+
+def filter(x):  # pylint: disable=redefined-builtin
+    """Crypto1 filterfunctie over de 20 laagste bits van een LFSR-helft."""
+    return _FC >> (_FILTER_LO[x & 0xFF] | _FILTER_HI[x >> 8 & 0xFFF]) & 1
+
+
+def parity(x):
+    """Pariteit van een 32-bit woord."""
+    x ^= x >> 16
+    return _PARITY[(x ^ x >> 8) & 0xFF]
+
+
+def bebit(x, n):
+    """Bit n van een woord in de (byte-omgedraaide) volgorde van de kaart."""
+    return x >> (n ^ 24) & 1
+
+
+def swapendian(x):
+    return (x >> 24 & 0xFF) | (x >> 8 & 0xFF00) | (x << 8 & 0xFF0000) | (x << 24 & 0xFF000000)
+
+
+def prng_successor(x, n):
+    """Schuif de 16-bit PRNG van de tag n stappen door."""
+    x = swapendian(x)
+    for _ in range(n):
+        x = x >> 1 | ((x >> 16 ^ x >> 18 ^ x >> 19 ^ x >> 21) & 1) << 31
+    return swapendian(x)
+
+
+class Crypto1:
+    """Toestand van het 48-bit Crypto1 LFSR, opgesplitst in oneven/even helft."""
+
+    __slots__ = ("odd", "even")
+
+    def __init__(self, key=0, odd=None, even=None):
+        if odd is not None:
+            self.odd = odd
+            self.even = even
+            return
+        self.odd = 0
+        self.even = 0
+        for i in range(47, 0, -2):
+            self.odd = self.odd << 1 | key >> ((i - 1) ^ 7) & 1
+            self.even = self.even << 1 | key >> (i ^ 7) & 1
+
+    def lfsr(self):
+        """Geef de 48-bit LFSR-waarde (de sleutel, na volledige rollback)."""
+        lfsr = 0
+        for i in range(23, -1, -1):
+            lfsr = lfsr << 1 | self.odd >> (i ^ 3) & 1
+            lfsr = lfsr << 1 | self.even >> (i ^ 3) & 1
+        return lfsr
+
+    def word(self, in_word=0, is_encrypted=0):
+        """Klok 32 bits in (big-endian bitvolgorde) en geef de keystream terug."""
+        self.odd, self.even, ret = _word(self.odd, self.even, in_word, is_encrypted)
+        return ret
+
+    def rollback_word(self, in_word=0, fb=0):
+        """Draai 32 bits terug; fb=1 als in_word versleuteld was ingeklokt."""
+        self.odd, self.even, ret = _rollback_word(self.odd, self.even, in_word, fb)
+        return ret
+
+
+# De woordfuncties werken op losse ints met alles ingelijnd: dit is het hete pad
+# van mfkey32 (elke kandidaat wordt teruggedraaid en opnieuw ingeklokt).
+# parity(a) ^ parity(b) == parity(a ^ b), dus één pariteit per bit volstaat.
+
+def _word(odd, even, in_word, fb, bits=32):
+    fl, fh, par = _FILTER_LO, _FILTER_HI, _PARITY
+    ret = 0
+    for i in range(bits):
+        n = i ^ 24
+        f = _FC >> (fl[odd & 0xFF] | fh[odd >> 8 & 0xFFF]) & 1
+        x = (odd & LF_POLY_ODD) ^ (even & LF_POLY_EVEN)
+        x ^= x >> 16
+        x = par[(x ^ x >> 8) & 0xFF] ^ (in_word >> n & 1) ^ (f & fb)
+        odd, even = (even << 1 | x) & _MASK24, odd
+        ret |= f << n
+    return odd, even, ret
+
+
+def _rollback_word(odd, even, in_word, fb):
+    fl, fh, par = _FILTER_LO, _FILTER_HI, _PARITY
+    ret = 0
+    for i in range(31, -1, -1):
+        n = i ^ 24
+        odd, even = even, odd & _MASK24
+        out = even & 1
+        even >>= 1
+        f = _FC >> (fl[odd & 0xFF] | fh[odd >> 8 & 0xFFF]) & 1
+        x = (even & LF_POLY_EVEN) ^ (odd & LF_POLY_ODD)
+        x ^= x >> 16
+        even |= (out ^ par[(x ^ x >> 8) & 0xFF] ^ (in_word >> n & 1) ^ (f & fb)) << 23
+        ret |= f << n
+    return odd, even, ret
+
+
+# -------------------- Sleutelherstel (lfsr_recovery) --------------------
+
+def _split_keystream(words):
+    """Splits keystream-woorden in de bits voor de oneven en de even helft."""
+    oks = eks = 0
+    for w in reversed(words):
+        for i in range(31, -1, -2):
+            oks = oks << 1 | bebit(w, i)
+            eks = eks << 1 | bebit(w, i - 1)
+    return oks, eks
+
+
+def _initial_table(bit):
+    """Alle 20-bit helften waarvan het filter `bit` oplevert, per blok van 64."""
+    lo = [[], [], [], []]
+    for x in range(1 << 8):
+        lo[_FILTER_LO[x] >> 3].append(x)
+    hi = [[] for _ in range(8)]
+    for x in range(1 << 12):
+        hi[_FILTER_HI[x]].append(x << 8)
+    for f in range(32):
+        if _FC >> f & 1 == bit:
+            lows = array("I", lo[f >> 3])
+            for h in hi[f & 7]:
+                yield lows, h
+
+
+# Beslistabel voor het uitbreiden met één bit: index = filterinvoer voor x en x|1
+# (2x5 bits), waarde = 0 (vervalt), 1 (alleen x), 2 (alleen x|1) of 3 (beide).
+_EXT_LO = array("H", (_FILTER_LO[x & 0xFE] | _FILTER_LO[x | 1] << 5 for x in range(1 << 8)))
+_EXT_HI = array("H", (h | h << 5 for h in _FILTER_HI))
+
+
+def _decisions(bit):
+    table = bytearray(1 << 10)
+    for i in range(1 << 10):
+        f0 = _FC >> (i & 0x1F) & 1
+        f1 = _FC >> (i >> 5) & 1
+        table[i] = (f0 == bit) | (f1 == bit) << 1
+    return bytes(table)
+
+
+_EXT = (_decisions(0), _decisions(1))
+
+
+def _extend_simple(tbl, bit):
+    lo, hi, dec = _EXT_LO, _EXT_HI, _EXT[bit]
+    out = array("I")
+    append = out.append
+    for x in tbl:
+        x <<= 1
+        d = dec[lo[x & 0xFF] | hi[x >> 8 & 0xFFF]]
+        if d == 3:
+            append(x)
+            append(x | 1)
+        elif d:
+            append(x | d >> 1)
+    return out
+
+
+def _extend(tbl, bit, m1, m2):
+    """
+    Breid elke kandidaat één bit uit en schuif de pariteit van zijn bijdrage aan
+    de feedback (masker m1/m2) in de bovenste byte, zoals extend_table in crapto1.
+    """
+    lo, hi, dec, par = _EXT_LO, _EXT_HI, _EXT[bit], _PARITY
+    m1b = m1 & 1
+    m2b = m2 & 1
+    out = array("I")
+    append = out.append
+    for x in tbl:
+        x = x << 1 & _MASK32
+        d = dec[lo[x & 0xFF] | hi[x >> 8 & 0xFFF]]
+        if not d:
+            continue
+        a = x & m1
+        a ^= a >> 16
+        a = par[(a ^ a >> 8) & 0xFF]
+        b = x & m2
+        b ^= b >> 16
+        b = par[(b ^ b >> 8) & 0xFF]
+        x = (x >> 23 & 0xFC) << 24 | (x & _MASK24)
+        if d & 1:
+            append(x | (a << 1 | b) << 24)
+        if d & 2:
+            append(x | 1 | ((a ^ m1b) << 1 | (b ^ m2b)) << 24)
+    return out
+
+
+_ODD_MASKS = (LF_POLY_EVEN << 1 | 1, LF_POLY_ODD << 1)
+_EVEN_MASKS = (LF_POLY_ODD, LF_POLY_EVEN << 1 | 1)
+
+
+def _buckets(tbl, rounds=1, rnd=0):
+    """Verdeel een tabel op de bovenste byte (de feedback-bijdrage), alleen de buckets van ronde rnd."""
+    buckets = {}
+    for x in tbl:
+        b = x >> 24
+        if b % rounds == rnd:
+            if b not in buckets:
+                buckets[b] = array("I")
+            buckets[b].append(x)
+    return buckets
+
+
+_BUILD_BLOCKS = const(8192)  # Blokken die _initial_table per helft oplevert
+_BUILD_STEP = const(64)      # Blokken tussen twee voortgangsmeldingen
+_HALF_SIZE = const(540000)   # Kandidaten per helft na _build_half (gemeten, ~2^19)
+
+
+def _build_half(ks, masks, rounds, rnd, start, span):
+    """
+    Bouw de gebucketete kandidaten van een helft voor geheugenronde rnd, blok
+    voor blok uit de begintabel; alleen de buckets van deze ronde blijven
+    bewaard. Generator: levert tussendoor de voortgang (start .. start+span)
+    op; het resultaat is de dict bovenste byte -> array('I').
+    """
+    result = {}
+    for i, (lows, h) in enumerate(_initial_table(ks & 1)):
+        if i % _BUILD_STEP == 0:
+            yield start + span * i // _BUILD_BLOCKS
+        tbl = array("I", [h | x for x in lows])
+        k = ks
+        for _ in range(4):
+            k >>= 1
+            tbl = _extend_simple(tbl, k & 1)
+            if not tbl:
+                break
+        for _ in range(4):
+            k >>= 1
+            if not tbl:
+                break
+            tbl = _extend(tbl, k & 1, masks[0], masks[1])
+        for b, part in _buckets(tbl, rounds, rnd).items():
+            if b in result:
+                result[b].extend(part)
+            else:
+                result[b] = part
+    return result
+
+
+def _recover(odd, even, oks, eks, rem):
+    if rem == -1:
+        for e in even:
+            e = e << 1 ^ parity(e & LF_POLY_EVEN)
+            for o in odd:
+                yield (e ^ parity(o & LF_POLY_ODD)) & _MASK24, o & _MASK24
+        return
+    for _ in range(4):
+        rem -= 1
+        if rem == -1:
+            break
+        oks >>= 1
+        eks >>= 1
+        odd = _extend(odd, oks & 1, _ODD_MASKS[0], _ODD_MASKS[1])
+        if not odd:
+            return
+        even = _extend(even, eks & 1, _EVEN_MASKS[0], _EVEN_MASKS[1])
+        if not even:
+            return
+    odd_buckets = _buckets(odd)
+    del odd
+    even_buckets = _buckets(even)
+    del even
+    for b, o in odd_buckets.items():
+        e = even_buckets.get(b)
+        if e:
+            yield from _recover(o, e, oks, eks, rem)
+
+
+def _rounds_for(budget):
+    """Aantal rondes zodat elke helft maximaal `budget` kandidaten bevat."""
+    if budget is None:
+        if mem_free is None:
+            return 1
+        collect()
+        budget = mem_free() // 16
+    rounds = 1
+    while rounds < 256 and _HALF_SIZE // rounds > budget:
+        rounds <<= 1
+    return rounds
+
+
+def lfsr_recovery(words, budget=None, progress=False):
+    """
+    Genereer alle LFSR-toestanden die de gegeven keystream-woorden produceren.
+    De toestanden gelden ná het laatste woord. Met één woord (mfkey32) zijn dat
+    er ~2^16; voor twee woorden is lfsr_recovery64 sneller.
+    budget: maximaal aantal kandidaten per helft in het geheugen (None = uit
+    gc.mem_free(), op CPython onbeperkt). Elke ronde bouwt beide helften één
+    keer op, alleen voor zijn eigen buckets, en voegt ze bucket voor bucket
+    samen; op CPython is het één ronde.
+    progress: lever tussen de dure stappen door ook de voortgang (int, 0-100) op.
+    """
+    oks, eks = _split_keystream(words)
+    rem = 16 * len(words) - 9
+    rounds = _rounds_for(budget)
+    for rnd in range(rounds):
+        start = 100 * rnd // rounds
+        span = 100 * (rnd + 1) // rounds - start
+        steps = _build_half(oks, _ODD_MASKS, rounds, rnd, start, span * 2 // 5)
+        odd_buckets = yield from (steps if progress else _quiet(steps))
+        steps = _build_half(eks, _EVEN_MASKS, rounds, rnd, start + span * 2 // 5, span * 2 // 5)
+        even_buckets = yield from (steps if progress else _quiet(steps))
+        count = len(odd_buckets)
+        for i, b in enumerate(sorted(odd_buckets)):
+            o = odd_buckets.pop(b)
+            e = even_buckets.pop(b, None)
+            if e:
+                yield from _recover(o, e, oks >> 8, eks >> 8, rem)
+            del o, e
+            if progress:
+                yield start + span * 4 // 5 + (span - span * 4 // 5) * (i + 1) // count
+        del odd_buckets, even_buckets
+
+
+def _quiet(steps):
+    """Draai een generator af zonder zijn tussenwaarden door te geven; retourneert zijn resultaat."""
+    while True:
+        try:
+            next(steps)
+        except StopIteration as e:
+            return e.value
+
+
+# -------------------- Sleutelherstel uit 64 bits (lfsr_recovery64) --------------------
+
+_SEQ_BITS = const(48)    # Zoveel bits van de reeks in het filter-slot leggen de toestand vast
+_CHECK_BITS = const(9)   # Zoveel keystreambits 1, 3, 5, ... strepen kandidaten af vóór de volledige controle
+_tables64 = None
+
+
+def _tables64_build():
+    """
+    Tabellen voor lfsr_recovery64, pas bij het eerste gebruik opgebouwd.
+
+    Uitbreiden met twee bits tegelijk: per paar keystreambits zegt allowed[z][x >> 6]
+    welke LO-waarden van het filter (4 bits per venster) nog kunnen, en dec
+    welke twee nieuwe bits (masker over 0..3) daarbij passen.
+
+    Lineaire afbeeldingen vanuit V, de 48 bits die bij keystreambit 0, 2, 4, ...
+    door het filter-slot schuiven (bit 0 = nieuwste), per byte van V: de toestand
+    vóór bit 0 (odd | even << 24) en Q, de vensters voor keystreambit 1, 3, 5, ...
+    Zonder invoer en terugkoppeling van het filter is het LFSR lineair, dus elke
+    basistoestand wordt doorgerekend en het stelsel V -> toestand omgekeerd.
+    """
+    allowed = []
+    for z in range(4):
+        ok = [sum(1 << lo for lo in range(4) if _FC >> (lo << 3 | hi) & 1 == bit) for hi in range(8)
+              for bit in (z & 1, z >> 1)]
+        allowed.append(bytes(ok[2 * _FILTER_HI[y >> 1 & 0xFFF]] | ok[2 * _FILTER_HI[y & 0xFFF] + 1] << 4
+                             for y in range(1 << 13)))
+    dec = bytearray(1 << 15)
+    for i in range(1 << 15):
+        x, a1, a2 = i & 0x7F, i >> 7 & 0xF, i >> 11
+        for c in range(4):
+            if (a1 >> (_FILTER_LO[(x << 1 | c >> 1) & 0xFF] >> 3) & 1
+                    and a2 >> (_FILTER_LO[(x << 2 | c) & 0xFF] >> 3) & 1):
+                dec[i] |= 1 << c
+    rows = []
+    for b in range(_SEQ_BITS):
+        odd, even = (1 << b, 0) if b < 24 else (0, 1 << (b - 24))
+        o12, e12, _ = _word(odd, even, 0, 0, 24)
+        o28, _, _ = _word(o12, e12, 0, 0, 32)
+        v = o28 | o12 << 16 | (odd & 0xFFFFF) << 28
+        r0, e, _ = _word(odd, even, 0, 0, 1)
+        r8, _, _ = _word(r0, e, 0, 0, 2 * (_CHECK_BITS - 1))
+        q = r0 << (_CHECK_BITS - 1) | r8 & ((1 << (_CHECK_BITS - 1)) - 1)
+        rows.append([v, odd | even << 24, q])
+    # Gauss over GF(2): rij j krijgt V = 1 << j
+    for j in range(_SEQ_BITS):
+        p = next(i for i in range(j, _SEQ_BITS) if rows[i][0] >> j & 1)
+        rows[j], rows[p] = rows[p], rows[j]
+        for i in range(_SEQ_BITS):
+            if i != j and rows[i][0] >> j & 1:
+                rows[i] = [a ^ b for a, b in zip(rows[i], rows[j])]
+    state = array("Q", bytes(8 * 6 * 256))
+    check = array("I", bytes(4 * 6 * 256))
+    for pos in range(6):
+        for bit in range(8):
+            row = rows[8 * pos + bit]
+            for v in range(pos << 8, pos << 8 | 1 << bit):
+                state[v | 1 << bit] = state[v] ^ row[1]
+                check[v | 1 << bit] = check[v] ^ row[2]
+    return allowed, bytes(dec), state, check
+
+
+_PAIRS = tuple(tuple(c for c in range(4) if m >> c & 1) for m in range(16))
+
+
+def _extend2(tbl, allowed, dec):
+    """Breid elke kandidaat (array('Q')) met twee bits uit; zie _tables64_build."""
+    pairs = _PAIRS
+    return array("Q", [x << 2 | c for x in tbl for c in pairs[dec[(x & 0x7F) | allowed[x >> 6 & 0x1FFF] << 7]]])
+
+
+def _keystream_bits(ks2, ks3, first):
+    """Keystreambits first, first+2, ... (van {ar} en dan {at}), bit 0 = de eerste."""
+    bits = 0
+    for n in range(62 + first, -1, -2):
+        bits = bits << 1 | bebit(ks3 if n >= 32 else ks2, n & 31)
+    return bits
+
+
+def lfsr_recovery64(ks2, ks3, progress=False):
+    """
+    Genereer de LFSR-toestanden (odd, even) vlak vóór {ar} die de 64 bits
+    keystream ks2, ks3 van een volledige authenticatie produceren (mfkey64).
+    Alleen de reeks door het filter-slot wordt opgesomd, blok voor blok uit de
+    begintabel en 48 bits diep (29 filterbits); de vensters voor de andere
+    keystreambits volgen daar lineair uit en strepen bijna alles af, de rest
+    wordt volledig nagerekend. Er staat
+    nooit meer dan één blok kandidaten in het geheugen.
+    progress: lever tussendoor ook de voortgang (int, 0-100) op.
+    """
+    global _tables64
+    if _tables64 is None:
+        _tables64 = _tables64_build()
+    allowed, dec, state, check = _tables64
+    fl, fh = _FILTER_LO, _FILTER_HI
+    slot_bits = _keystream_bits(ks2, ks3, 0)
+    check_bits = _keystream_bits(ks2, ks3, 1)
+    for i, (lows, h) in enumerate(_initial_table(slot_bits & 1)):
+        if progress and i % _BUILD_STEP == 0:
+            yield 100 * i // _BUILD_BLOCKS
+        tbl = array("Q", [h | x for x in lows])
+        k = slot_bits >> 1
+        for _ in range((_SEQ_BITS - 20) // 2):
+            tbl = _extend2(tbl, allowed[k & 3], dec)
+            if not tbl:
+                break
+            k >>= 2
+        for v in tbl:
+            q = (check[v & 0xFF] ^ check[256 | v >> 8 & 0xFF] ^ check[512 | v >> 16 & 0xFF]
+                 ^ check[768 | v >> 24 & 0xFF] ^ check[1024 | v >> 32 & 0xFF] ^ check[1280 | v >> 40])
+            for n in range(_CHECK_BITS):
+                w = q >> (_CHECK_BITS - 1 - n)
+                if _FC >> (fl[w & 0xFF] | fh[w >> 8 & 0xFFF]) & 1 != check_bits >> n & 1:
+                    break
+            else:
+                s = (state[v & 0xFF] ^ state[256 | v >> 8 & 0xFF] ^ state[512 | v >> 16 & 0xFF]
+                     ^ state[768 | v >> 24 & 0xFF] ^ state[1024 | v >> 32 & 0xFF] ^ state[1280 | v >> 40])
+                odd, even = s & _MASK24, s >> 24
+                o, e, ret = _word(odd, even, 0, 0)
+                if ret == ks2 and _word(o, e, 0, 0)[2] == ks3:
+                    yield odd, even
+
+
+# -------------------- Aanvallen --------------------
+
+def _linear_step(step):
+    """
+    Zonder invoer en zonder terugkoppeling van het filter is het LFSR lineair:
+    een 32-bit stap is dan een XOR van bijdragen per byte van de toestand.
+    """
+    odd_t = array("I", bytes(4 * 6 * 256))
+    even_t = array("I", bytes(4 * 6 * 256))
+    for pos in range(6):
+        for v in range(256):
+            shift = 8 * (pos % 3)
+            if pos < 3:
+                o, e, _ = step(v << shift, 0, 0, 0)
+            else:
+                o, e, _ = step(0, v << shift, 0, 0)
+            odd_t[pos << 8 | v] = o
+            even_t[pos << 8 | v] = e
+
+    def apply(odd, even):
+        o = e = 0
+        for pos in range(3):
+            i = pos << 8 | (odd >> 8 * pos & 0xFF)
+            j = (pos + 3) << 8 | (even >> 8 * pos & 0xFF)
+            o ^= odd_t[i] ^ odd_t[j]
+            e ^= even_t[i] ^ even_t[j]
+        return o, e
+
+    return apply
+
+
+def _first_key(steps):
+    for _, key in steps:
+        if key is not None:
+            return key
+    return None
+
+
+def mfkey32(uid, nt0, nr0_enc, ar0_enc, nt1, nr1_enc, ar1_enc, budget=None):
+    """
+    Herstel de sectorsleutel uit twee onvolledige authenticaties (mfkey32v2).
+    Alle parameters zijn 32-bit ints. Geeft de 48-bit sleutel terug, of None.
+    budget: zie lfsr_recovery.
+    """
+    return _first_key(mfkey32_steps(uid, nt0, nr0_enc, ar0_enc, nt1, nr1_enc, ar1_enc, budget))
+
+
+def mfkey32_steps(uid, nt0, nr0_enc, ar0_enc, nt1, nr1_enc, ar1_enc, budget=None):
+    """
+    mfkey32 in stappen: levert (voortgang, None) op tussen de dure delen, zodat
+    de aanroeper de event loop kan vrijgeven, en tot slot (100, sleutel) als die
+    gevonden is.
+    """
+    ks2 = ar0_enc ^ prng_successor(nt0, 64)
+    ks2_1 = ar1_enc ^ prng_successor(nt1, 64)
+    rollback_ks = _linear_step(_rollback_word)
+    # uid^nt0 terugdraaien en uid^nt1 inklokken is samen één XOR met g(nt0^nt1).
+    g_odd, g_even, _ = _word(0, 0, nt0 ^ nt1, 0)
+    for state in lfsr_recovery((ks2,), budget, progress=True):
+        if type(state) is int:
+            yield state, None
+            continue
+        odd, even = rollback_ks(*state)
+        odd, even, _ = _rollback_word(odd, even, nr0_enc, 1)
+        o, e, _ = _word(odd ^ g_odd, even ^ g_even, nr1_enc, 1)
+        # Eerst alleen de eerste byte van {ar1}: verwerpt 255/256 kandidaten.
+        if _word(o, e, 0, 0, 8)[2] != ks2_1 & 0xFF000000:
+            continue
+        if _word(o, e, 0, 0)[2] == ks2_1:
+            odd, even, _ = _rollback_word(odd, even, uid ^ nt0, 0)
+            yield 100, Crypto1(odd=odd, even=even).lfsr()
+            return
+
+
+def mfkey64(uid, nt, nr_enc, ar_enc, at_enc):
+    """
+    Herstel de sleutel uit één volledige authenticatie (nt, {nr}, {ar}, {at}).
+    Met 64 bits keystream blijft er maar één toestand over, dus er hoeft geen
+    tweede nonce geprobeerd te worden. Geeft de 48-bit sleutel terug, of None.
+    """
+    return _first_key(mfkey64_steps(uid, nt, nr_enc, ar_enc, at_enc))
+
+
+def mfkey64_steps(uid, nt, nr_enc, ar_enc, at_enc):
+    """
+    mfkey64 in stappen; zie mfkey32_steps. lfsr_recovery64 geeft de toestand
+    vlak vóór {ar}; daarvandaan is het alleen nog {nr} en uid^nt terugdraaien.
+    """
+    ks2 = ar_enc ^ prng_successor(nt, 64)
+    ks3 = at_enc ^ prng_successor(nt, 96)
+    for state in lfsr_recovery64(ks2, ks3, progress=True):
+        if type(state) is int:
+            yield state, None
+            continue
+        odd, even, _ = _rollback_word(state[0], state[1], nr_enc, 1)
+        odd, even, _ = _rollback_word(odd, even, uid ^ nt, 0)
+        yield 100, Crypto1(odd=odd, even=even).lfsr()
+        return
+
+
+def key_to_hex(key):
+    return "{:012X}".format(key)
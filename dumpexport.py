@@ -0,0 +1,161 @@
+"""
+Export van een CardImage naar bestandsformaten van desktoptools:
+
+- mfd: ruw binair kaartbeeld (Proxmark, mfoc, libnfc)
+- eml: één blok per regel als 32 hex-tekens (Proxmark emulatorgeheugen)
+- nfc: Flipper Zero NFC-bestand, onbekende bytes als "??"
+
+Een DumpExport gedraagt zich als een geopend bestand (readinto/close) en kan zo
+naar WiFiChip.respond: de sender vult zijn CIPSEND-chunks er blok voor blok uit,
+zonder dat het hele bestand ooit in RAM staat. De lengte is vooraf bekend.
+
+In sector trailers worden bekende sleutels ingevuld; key A leest de kaart zelf altijd als nullen.
+"""
+
+import mifare
+
+FORMATS = {  # formaat -> Content-Type
+    "mfd": "application/octet-stream",
+    "eml": "text/plain; charset=utf-8",
+    "nfc": "text/plain; charset=utf-8",
+}
+
+_HEX_LOWER = b"0123456789abcdef"
+_HEX_UPPER = b"0123456789ABCDEF"
+_ALL_KNOWN = 0xFFFF
+
+
+def _hex_into(line, pos, value, digits):
+    line[pos] = digits[value >> 4]
+    line[pos + 1] = digits[value & 0xF]
+
+
+class DumpExport:
+    def __init__(self, image, fmt):
+        if fmt not in FORMATS:
+            raise ValueError("Onbekend exportformaat: " + fmt)
+        self.image = image
+        self.fmt = fmt
+        self._block = bytearray(mifare.BLOCK_SIZE)  # Blok met ingevulde sleutels
+        self._line = bytearray(64)                   # Uitvoerregel van het huidige blok
+        self._pending = b""
+        self._pieces = self._generate()
+
+    def filename(self):
+        return "{}.{}".format(self.image.uid.hex(), self.fmt)
+
+    def content_type(self):
+        return FORMATS[self.fmt]
+
+    # -------------------- Lengte --------------------
+
+    def __len__(self):
+        count = self.image.block_count
+        if self.fmt == "mfd":
+            return count * mifare.BLOCK_SIZE
+        if self.fmt == "eml":
+            return count * 33
+        # "Block <n>: " + 16 keer "XX" met spaties ertussen + "\n"
+        lines = sum(len(str(n)) for n in range(count)) + count * (len("Block : ") + 47 + 1)
+        return len(self._nfc_header()) + lines
+
+    # -------------------- Bestand-interface --------------------
+
+    def readinto(self, buf):
+        n = 0
+        size = len(buf)
+        while n < size:
+            if not self._pending:
+                try:
+                    self._pending = next(self._pieces)
+                except StopIteration:
+                    break
+            take = min(size - n, len(self._pending))
+            buf[n:n + take] = self._pending[:take]
+            self._pending = self._pending[take:]
+            n += take
+        return n
+
+    def close(self):
+        self._pieces = iter(())
+        self._pending = b""
+
+    # -------------------- Opbouw --------------------
+
+    def _merged(self, n):
+        """
+        Vul self._block met blok n, met bekende sleutels in de trailer.
+        Retourneert een 16-bits masker van de bytes die bekend zijn.
+        """
+        image = self.image
+        block = self._block
+        data = image.block(n)
+        if data is None:
+            block[:] = bytes(mifare.BLOCK_SIZE)
+            known = 0
+        else:
+            block[:] = data
+            known = _ALL_KNOWN
+        sector = mifare.sector_of(n)
+        if n == mifare.trailer_block(sector):
+            # Een gelezen trailer geeft de sleutels niet (key A leest als nullen):
+            # die bytes zijn alleen bekend als de sleutel zelf bekend is
+            known &= ~0xFC3F
+            key = image.key(sector, mifare.KEY_A)
+            if key is not None:
+                block[0:6] = key
+                known |= 0x003F
+            key = image.key(sector, mifare.KEY_B)
+            if key is not None:
+                block[10:16] = key
+                known |= 0xFC00
+        return known
+
+    def _generate(self):
+        count = self.image.block_count
+        line = self._line
+        view = memoryview(line)
+        block_view = memoryview(self._block)
+        if self.fmt == "nfc":
+            yield self._nfc_header()
+        for n in range(count):
+            known = self._merged(n)
+            if self.fmt == "mfd":
+                yield block_view
+                continue
+            if self.fmt == "eml":
+                for i in range(mifare.BLOCK_SIZE):
+                    _hex_into(line, 2 * i, self._block[i], _HEX_LOWER)
+                line[32] = 0x0A
+                yield view[:33]
+                continue
+            head = b"Block %d: " % n
+            pos = len(head)
+            line[:pos] = head
+            for i in range(mifare.BLOCK_SIZE):
+                if known >> i & 1:
+                    _hex_into(line, pos, self._block[i], _HEX_UPPER)
+                else:
+                    line[pos] = line[pos + 1] = 0x3F  # "??"
+                line[pos + 2] = 0x20 if i < mifare.BLOCK_SIZE - 1 else 0x0A
+                pos += 3
+            yield view[:pos]
+
+    def _nfc_header(self):
+        image = self.image
+        atqa = image.atqa if image.atqa is not None else b"\x00\x04"
+        return "".join((
+            "Filetype: Flipper NFC device\n",
+            "Version: 4\n",
+            "# Device type can be ISO14443-3A, ISO14443-3B, ISO14443-4A, NTAG/Ultralight, Mifare Classic, Mifare DESFire\n",
+            "Device type: Mifare Classic\n",
+            "# UID is common for all formats\n",
+            "UID: ", " ".join("{:02X}".format(b) for b in image.uid), "\n",
+            "# ISO14443-3A specific data\n",
+            "ATQA: ", " ".join("{:02X}".format(b) for b in atqa), "\n",
+            "SAK: {:02X}\n".format(image.sak),
+            "# Mifare Classic specific data\n",
+            "Mifare Classic type: ", "4K" if image.sak == mifare.SAK_CLASSIC_4K else "1K", "\n",
+            "Data format version: 2\n",
+            "# Mifare Classic blocks, '??' means unknown data\n",
+        )).encode()
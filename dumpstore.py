@@ -0,0 +1,143 @@
+"""
+Opslag van kaartdumps op flash, per UID.
+
+Elke dump is één bestand (dumps/<UID>.bin, zie CardImage.write_to) dat in één
+keer geschreven en daarna nooit meer aangepast wordt; een nieuwe dump van
+dezelfde kaart vervangt het bestand alleen als de inhoud echt veranderd is.
+Een klein indexbestand (dumps/index.json) koppelt UID aan grootte, CRC, het
+moment van laatste gebruik en het aantal gelezen blokken, zodat opzoeken één dict-lookup is en er bij het
+opstarten geen dumps gelezen hoeven te worden.
+
+Om flash te sparen wordt de index niet bij elke lookup weggeschreven, maar
+pas na een paar wijzigingen of samen met een nieuwe dump. Raakt de vrije
+ruimte op, dan verdwijnen de langst niet gebruikte dumps.
+"""
+
+import json
+import os
+from cardimage import CardImage
+from display import debug_print
+
+STORE_DIR = "dumps"
+MAX_DUMPS = 32                # Meer dumps houden we niet bij, ook als er ruimte is
+MIN_FREE_BYTES = 64 * 1024    # Zoveel flash blijft vrij voor keycache, templates en logs
+INDEX_FLUSH_EVERY = 8         # Lookups die de index mogen veranderen voor hij weggeschreven wordt
+
+
+class DumpStore:
+    def __init__(self, directory=STORE_DIR):
+        self.directory = directory
+        self.index = {}   # UID-hex -> [grootte, crc, laatst gebruikt, gelezen blokken]
+        self.clock = 0    # Oplopende teller voor "laatst gebruikt"
+        self._pending = 0  # Indexwijzigingen sinds de laatste flush
+        try:
+            os.mkdir(directory)
+        except OSError:
+            pass  # Bestaat al
+        self._load_index()
+
+    def _path(self, name):
+        return "{}/{}".format(self.directory, name)
+
+    def _load_index(self):
+        try:
+            with open(self._path("index.json"), "r") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        self.index = data.get("dumps", {})
+        self.clock = data.get("clock", 0)
+
+    def flush(self):
+        """Schrijf de index weg als er iets veranderd is."""
+        if not self._pending:
+            return
+        try:
+            with open(self._path("index.json"), "w") as f:
+                json.dump({"clock": self.clock, "dumps": self.index}, f)
+            self._pending = 0
+        except OSError as e:
+            debug_print("Dump-index opslaan mislukt: " + str(e))
+
+    def _touch(self, uid_hex):
+        self.clock += 1
+        self.index[uid_hex][2] = self.clock
+        self._pending += 1
+        if self._pending >= INDEX_FLUSH_EVERY:
+            self.flush()
+
+    def __contains__(self, uid):
+        return bytes(uid).hex() in self.index
+
+    def blocks(self, uid):
+        """Aantal gelezen blokken in de opgeslagen dump van deze kaart (0 zonder dump)."""
+        entry = self.index.get(bytes(uid).hex())
+        return entry[3] if entry is not None and len(entry) > 3 else 0
+
+    def load(self, uid):
+        """De opgeslagen dump van deze kaart als CardImage, of None."""
+        uid_hex = bytes(uid).hex()
+        if uid_hex not in self.index:
+            return None
+        image = None
+        try:
+            with open(self._path(uid_hex + ".bin"), "rb") as f:
+                image = CardImage.read_from(f)
+        except OSError:
+            pass
+        if image is None or image.uid != bytes(uid):
+            debug_print("Opgeslagen dump onleesbaar: " + uid_hex)
+            self._forget(uid_hex)
+            return None
+        self._touch(uid_hex)
+        return image
+
+    def save(self, image):
+        """Bewaar een dump. Retourneert True als er naar flash geschreven is."""
+        uid_hex = image.uid.hex()
+        crc = image.crc()
+        entry = self.index.get(uid_hex)
+        if entry is not None and entry[1] == crc:
+            self._touch(uid_hex)  # Zelfde inhoud: niet opnieuw schrijven
+            return False
+        size = image.record_size()
+        self._make_room(size, keep=uid_hex)
+        try:
+            with open(self._path(uid_hex + ".bin"), "wb") as f:
+                image.write_to(f)
+        except OSError as e:
+            debug_print("Dump opslaan mislukt: " + str(e))
+            self._forget(uid_hex)
+            return False
+        self.clock += 1
+        self.index[uid_hex] = [size, crc, self.clock, image.blocks_read()]
+        self._pending += 1
+        self.flush()
+        return True
+
+    def _free_bytes(self):
+        try:
+            st = os.statvfs(self.directory)
+            return st[0] * st[4]  # f_bsize * f_bavail
+        except (OSError, AttributeError):
+            return None
+
+    def _make_room(self, size, keep=None):
+        """Gooi de langst niet gebruikte dumps weg tot er plek is voor size bytes."""
+        while True:
+            others = [u for u in self.index if u != keep]
+            free = self._free_bytes()
+            full = len(others) >= MAX_DUMPS
+            if not others or (not full and (free is None or free - size >= MIN_FREE_BYTES)):
+                return
+            oldest = min(others, key=lambda u: self.index[u][2])
+            debug_print("Dump verwijderd (LRU): " + oldest)
+            self._forget(oldest)
+
+    def _forget(self, uid_hex):
+        if self.index.pop(uid_hex, None) is not None:
+            self._pending += 1
+        try:
+            os.remove(self._path(uid_hex + ".bin"))
+        except OSError:
+            pass
@@ -0,0 +1,81 @@
+"""
+Afnemers van een dump die sector voor sector binnenkomt (NFCModule.stream_card).
+
+Elke afnemer krijgt start(image, sectoren) voor de eerste sector, sector(image,
+sector, gelukt) direct nadat een sector gelezen is, en end(image, afgemaakt) als
+de stroom stopt; afgemaakt is False als de kaart weg is of er geannuleerd werd.
+Zo staat de eerste sector al op de OLED en in /carddata terwijl de rest nog
+gelezen wordt, en gaat een half gelezen kaart niet verloren.
+"""
+
+from display import Display
+
+
+class DumpConsumer:
+    def start(self, image, sectors):
+        pass
+
+    def sector(self, image, sector, ok):
+        pass
+
+    def end(self, image, finished):
+        pass
+
+
+class OledProgress(DumpConsumer):
+    """Voortgang op de OLED: welke sector, en hoeveel er nog komen."""
+
+    def __init__(self):
+        self._total = 0
+        self._done = 0
+
+    def start(self, image, sectors):
+        self._total = len(sectors)
+        self._done = 0
+
+    def sector(self, image, sector, ok):
+        self._done += 1
+        Display.update_status("Dump {}/{}\nSector {}: {}".format(
+            self._done, self._total, sector, "ok" if ok else "--"))
+
+    def end(self, image, finished):
+        if not finished:
+            Display.update_status("Dump gestopt\n{} blokken".format(image.blocks_read()))
+
+
+class SnapshotFeed(DumpConsumer):
+    """Elke sector meteen in de snapshot (nieuwe versie/ETag) en als gebeurtenis voor /events."""
+
+    def __init__(self, snapshot, events):
+        self.snapshot = snapshot
+        self.events = events
+
+    def start(self, image, sectors):
+        self.snapshot.update(dump=image)
+
+    def sector(self, image, sector, ok):
+        self.snapshot.update(dump=image)
+        self.events.publish("sector", uid=image.uid.hex(), sector=sector, ok=ok)
+
+    def end(self, image, finished):
+        if not finished:
+            self.events.publish("dump_gestopt", uid=image.uid.hex(), blocks=image.blocks_read())
+        elif image.complete():
+            self.events.publish("dump_klaar", uid=image.uid.hex(), stats=image.stats, bron="kaart")
+
+
+class FlashStore(DumpConsumer):
+    """
+    Bewaar de dump op flash zodra de stroom stopt, ook als hij niet compleet is.
+    Een afgebroken stroom vervangt een opgeslagen dump alleen als hij minstens
+    zoveel blokken heeft. Eén write per stroom; DumpStore slaat ongewijzigde
+    dumps over.
+    """
+
+    def __init__(self, store):
+        self.store = store
+
+    def end(self, image, finished):
+        blocks = image.blocks_read()
+        if blocks and (finished or blocks >= self.store.blocks(image.uid)):
+            self.store.save(image)
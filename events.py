@@ -0,0 +1,45 @@
+"""
+Gebeurtenissen van het apparaat (kaart gevonden/weg, dump klaar, sleutel gevonden,
+job afgerond) voor de long-poll op /events.
+
+Elke gebeurtenis krijgt een oplopend volgnummer. Een client vraagt alles na het
+laatste nummer dat hij kent; is er nog niets, dan wacht het request tot er iets
+gebeurt of de timeout verloopt. Zo gaat er alleen verkeer over de UART als er nieuws is.
+"""
+
+import time
+import uasyncio as asyncio
+
+
+class EventFeed:
+    def __init__(self, keep=16):
+        self.keep = keep     # Aantal bewaarde gebeurtenissen voor clients die even weg waren
+        self.seq = 0         # Volgnummer van de laatste gebeurtenis
+        self._events = []    # [(seq, dict), ...], oudste eerst
+        self._changed = asyncio.Event()
+
+    def publish(self, kind, **data):
+        self.seq += 1
+        data["type"] = kind
+        data["seq"] = self.seq
+        data["t"] = time.ticks_ms()
+        self._events.append((self.seq, data))
+        if len(self._events) > self.keep:
+            self._events.pop(0)
+        # Alle wachtende clients wakker maken; nieuwe wachters krijgen een vers Event
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    def since(self, seq):
+        """Gebeurtenissen na seq, en of er tussendoor al gebeurtenissen vergeten zijn."""
+        missed = bool(self._events) and self._events[0][0] > seq + 1
+        return [data for s, data in self._events if s > seq], missed
+
+    async def wait(self, seq, timeout_ms):
+        """Wacht tot er iets na seq gebeurd is (of de timeout verloopt)."""
+        if self.seq <= seq:
+            try:
+                await asyncio.wait_for_ms(self._changed.wait(), timeout_ms)
+            except asyncio.TimeoutError:
+                pass
+        return self.since(seq)
@@ -0,0 +1,79 @@
+"""
+I2C transport for the PN532 driver in pn532.py (MicroPython machine.I2C).
+
+Every I2C read from the PN532 starts with a status byte (0x01 = ready). Frames
+are read with readfrom_into straight into the driver's preallocated RX/ACK
+buffers, status byte included (_READ_PREFIX), so a command round trip does not
+allocate.
+"""
+
+import time
+from micropython import const
+from machine import Pin
+from pn532 import PN532, BusyError
+
+_I2C_ADDRESS = const(0x24)
+
+
+class PN532_I2C(PN532):
+    """Driver for the PN532 connected over I2C."""
+
+    _READ_PREFIX = 1
+
+    def __init__(self, i2c, *, irq=None, reset=None, req=None, debug=False, address=_I2C_ADDRESS):
+        """Create an instance of the PN532 class using I2C. Note that PN532
+        uses clock stretching. Optional IRQ pin (readiness is then signalled
+        on the pin instead of polled over the bus), reset pin and debugging
+        output.
+        """
+        self.debug = debug
+        self._req = req
+        self._i2c = i2c
+        self._address = address
+        self._status = bytearray(1)
+        super().__init__(debug=debug, irq=irq, reset=reset)
+
+    def _wakeup(self):
+        """Send any special commands/data to wake up PN532"""
+        if self._req:
+            self._req.init(Pin.OUT)
+            self._req.value(0)
+            time.sleep_ms(10)
+            self._req.value(1)
+            time.sleep_ms(10)
+        self.low_power = False
+        self.SAM_configuration()  # Put the PN532 back in normal mode
+
+    def _wait_ready(self, timeout=1):
+        """Poll the status byte until the PN532 is ready or timeout (ms) expires."""
+        status = self._status
+        start = time.ticks_ms()
+        while True:
+            try:
+                self._i2c.readfrom_into(self._address, status)
+                if status[0] == 0x01:
+                    return True
+            except OSError:
+                pass  # Busy: the PN532 NACKs or stretches the clock
+            if time.ticks_diff(time.ticks_ms(), start) >= timeout:
+                return False
+            time.sleep_ms(1)
+
+    def _read_data_into(self, buf):
+        """Read status byte + data into buf (no allocation); returns len(buf)."""
+        self._i2c.readfrom_into(self._address, buf)
+        if buf[0] != 0x01:  # Not ready after all
+            raise BusyError
+        return len(buf)
+
+    def _read_data(self, count):
+        """Read a specified count of bytes from the PN532 (allocating variant)."""
+        frame = bytearray(count + 1)
+        self._read_data_into(frame)
+        if self.debug:
+            print("Reading: ", [hex(i) for i in frame[1:]])
+        return frame[1:]
+
+    def _write_data(self, framebytes):
+        """Write a specified count of bytes to the PN532"""
+        self._i2c.writeto(self._address, framebytes)
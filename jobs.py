@@ -0,0 +1,150 @@
+"""
+Achtergrondtaken (jobs) voor lange NFC-operaties: dumpen, opvangen, kraken, emuleren.
+
+Een job is een async functie func(job, *args) die tussen haar stappen
+`await job.step(voortgang, melding)` aanroept. Daar wordt de voortgang gemeld
+(OLED, /jobs/<id>), krijgt de rest van het systeem de beurt en wordt een
+annulering afgehandeld. Jobs draaien één voor één: ze delen de PN532.
+"""
+
+import time
+import uasyncio as asyncio
+from display import debug_print
+
+QUEUED = "wacht"
+RUNNING = "bezig"
+DONE = "klaar"
+FAILED = "fout"
+CANCELLED = "geannuleerd"
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job:
+    __slots__ = ("id", "name", "key", "state", "progress", "message", "result", "started", "finished",
+                 "cancelled", "_func", "_args", "_scheduler")
+
+    def __init__(self, scheduler, job_id, name, func, args, key=None):
+        self.id = job_id
+        self.name = name
+        self.key = key  # Waar de job over gaat (bijvoorbeeld de trace); zie JobScheduler.submit
+        self.state = QUEUED
+        self.progress = 0
+        self.message = ""
+        self.result = None
+        self.started = None
+        self.finished = None
+        self.cancelled = False
+        self._func = func
+        self._args = args
+        self._scheduler = scheduler
+
+    async def step(self, progress=None, message=None):
+        """Meld voortgang, geef de event loop vrij en stop als de job geannuleerd is."""
+        if progress is not None:
+            self.progress = progress
+        if message is not None:
+            self.message = message
+        self._scheduler._report(self)
+        await asyncio.sleep_ms(0)
+        if self.cancelled:
+            raise JobCancelled()
+
+    def to_dict(self):
+        elapsed = None
+        if self.started is not None:
+            end = self.finished if self.finished is not None else time.ticks_ms()
+            elapsed = time.ticks_diff(end, self.started)
+        return {"id": self.id, "naam": self.name, "status": self.state, "voortgang": self.progress,
+                "melding": self.message, "resultaat": self.result, "tijd_ms": elapsed}
+
+
+class JobScheduler:
+    def __init__(self, on_update=None, keep=8):
+        self.on_update = on_update  # Aangeroepen met de job bij een merkbare verandering
+        self.keep = keep            # Aantal afgeronde jobs dat opvraagbaar blijft
+        self.jobs = {}              # id -> Job, in volgorde van aanmaken
+        self.current = None
+        self._queue = []
+        self._next_id = 1
+        self._wake = asyncio.Event()
+        self._last_shown = None
+
+    def submit(self, name, func, *args, key=None):
+        """
+        Zet een job in de wachtrij en retourneer hem (job.id voor /jobs/<id>).
+        Met een key wordt een job met dezelfde naam en key die nog wacht of
+        bezig is teruggegeven in plaats van een tweede te starten.
+        """
+        if key is not None:
+            for job in self.jobs.values():
+                if job.name == name and job.key == key and job.state in (QUEUED, RUNNING):
+                    return job
+        job = Job(self, self._next_id, name, func, args, key)
+        self._next_id += 1
+        self.jobs[job.id] = job
+        self._queue.append(job)
+        self._forget_old()
+        self._report(job)
+        self._wake.set()
+        return job
+
+    def get(self, job_id):
+        return self.jobs.get(job_id)
+
+    def cancel(self, job_id=None):
+        """Annuleer een job (standaard de lopende). Retourneert True als er iets te annuleren was."""
+        job = self.current if job_id is None else self.jobs.get(job_id)
+        if job is None or job.state not in (QUEUED, RUNNING):
+            return False
+        job.cancelled = True
+        if job.state == QUEUED:
+            self._queue.remove(job)
+            self._finish(job, CANCELLED)
+        return True
+
+    def _forget_old(self):
+        done = [j for j in self.jobs.values() if j.state not in (QUEUED, RUNNING)]
+        for job in done[:max(0, len(done) - self.keep)]:
+            del self.jobs[job.id]
+
+    def _report(self, job):
+        # Alleen bij een nieuwe status of elke 5% naar de OLED; schrijven kost I2C-tijd
+        shown = (job.id, job.state, job.progress // 5)
+        if shown != self._last_shown and self.on_update is not None:
+            self._last_shown = shown
+            try:
+                self.on_update(job)
+            except Exception as e:
+                debug_print("Job-melding mislukt: " + str(e))
+
+    def _finish(self, job, state, result=None):
+        job.state = state
+        if result is not None:
+            job.result = result
+        job.finished = time.ticks_ms()
+        self._report(job)
+
+    async def run(self):
+        """Worker-taak: voer de jobs uit de wachtrij één voor één uit."""
+        while True:
+            if not self._queue:
+                self._wake.clear()
+                await self._wake.wait()
+                continue
+            job = self.current = self._queue.pop(0)
+            job.state = RUNNING
+            job.started = time.ticks_ms()
+            self._report(job)
+            try:
+                result = await job._func(job, *job._args)
+                job.progress = 100
+                self._finish(job, DONE, result)
+            except JobCancelled:
+                self._finish(job, CANCELLED)
+            except Exception as e:
+                debug_print("Job {} ({}) mislukt: {}".format(job.id, job.name, e))
+                self._finish(job, FAILED, str(e))
+            self.current = None
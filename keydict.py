@@ -0,0 +1,181 @@
+import json
+from display import debug_print
+from mifare import KEY_A, KEY_B
+
+# Veelgebruikte MIFARE Classic sleutels; aangevuld met keys.txt indien aanwezig.
+DEFAULT_KEYS = (
+    "FFFFFFFFFFFF",
+    "A0A1A2A3A4A5",
+    "D3F7D3F7D3F7",
+    "000000000000",
+    "B0B1B2B3B4B5",
+    "4D3A99C351DD",
+    "1A982C7E459A",
+    "AABBCCDDEEFF",
+    "714C5C886E97",
+    "587EE5F9350F",
+    "A0478CC39091",
+    "533CB6C723F6",
+    "8FD0A4F256E9",
+)
+
+MAX_CARDS = 32         # Zoveel kaarten (UID's) onthoudt de cache; daarna gaat de langst niet gebruikte eruit
+HITS_FLUSH_EVERY = 64  # Treffers die mogen binnenkomen voor ze (alleen voor de volgorde) naar flash gaan
+
+
+class KeyDictionary:
+    """
+    Sleutelwoordenboek voor het uitlezen van MIFARE Classic kaarten.
+    - Onthoudt per (UID, sector) welke sleutel (A/B) werkte.
+    - Sorteert het woordenboek op aantal treffers, zodat veelvoorkomende sleutels eerst komen.
+    - Een sleutel die op één sector werkte wordt op de andere sectors van die kaart eerst geprobeerd.
+    De cache gaat alleen naar flash als er een sleutel bij komt of verandert;
+    treffers veranderen alleen de volgorde en gaan pas per HITS_FLUSH_EVERY mee.
+    """
+
+    def __init__(self, cache_file="keycache.json"):
+        self.cache_file = cache_file
+        self.keys = [bytes.fromhex(k) for k in DEFAULT_KEYS]
+        self.hits = {}    # sleutel (bytes) -> aantal geslaagde authenticaties
+        self.known = {}   # "UID:sector:A" / "UID:sector:B" -> (key_type, sleutel)
+        self.card_keys = {}  # UID -> sleutels die op deze kaart werkten, meest recent eerst
+        self.used = {}    # UID -> clock van het laatste gebruik (voor MAX_CARDS)
+        self.clock = 0
+        self.dirty = False
+        self._pending_hits = 0  # Treffers sinds de laatste keer opslaan
+
+    def load(self, filename="keys.txt"):
+        """Laad extra sleutels (één hex-sleutel per regel, '#' voor commentaar)."""
+        added = 0
+        try:
+            with open(filename, "r") as f:
+                for line in f:
+                    line = line.split("#")[0].strip()
+                    if len(line) != 12:
+                        continue
+                    try:
+                        key = bytes.fromhex(line)
+                    except ValueError:
+                        continue
+                    if key not in self.keys:
+                        self.keys.append(key)
+                        added += 1
+        except OSError:
+            debug_print("Geen sleutelbestand gevonden: " + filename)
+        debug_print("Sleutels geladen: {} nieuw, {} totaal".format(added, len(self.keys)))
+        return added
+
+    def load_cache(self):
+        """Laad de eerder gevonden sleutels per (UID, sector) en de treffers."""
+        try:
+            with open(self.cache_file, "r") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        for name, (key_type, key) in data.get("known", {}).items():
+            key = bytes.fromhex(key)
+            self.known[name] = (key_type, key)
+            uid = name.split(":")[0]
+            keys = self.card_keys.setdefault(uid, [])
+            if key not in keys:
+                keys.append(key)
+        self.used = data.get("used", {})
+        self.clock = data.get("clock", 0)
+        for key, count in data.get("hits", {}).items():
+            key = bytes.fromhex(key)
+            self.hits[key] = count
+            if key not in self.keys:
+                self.keys.append(key)
+        self._sort()
+
+    def save_cache(self):
+        """Schrijf de cache alleen weg als er iets veranderd is (spaart flash)."""
+        if not self.dirty:
+            return
+        data = {
+            "known": {name: [kt, key.hex()] for name, (kt, key) in self.known.items()},
+            "hits": {key.hex(): count for key, count in self.hits.items()},
+            "used": self.used,
+            "clock": self.clock,
+        }
+        try:
+            with open(self.cache_file, "w") as f:
+                json.dump(data, f)
+            self.dirty = False
+            self._pending_hits = 0
+        except OSError as e:
+            debug_print("Sleutelcache opslaan mislukt: " + str(e))
+
+    @staticmethod
+    def _uid_str(uid):
+        return "".join("{:02X}".format(b) for b in uid)
+
+    def _name(self, uid, sector, key_type):
+        return "{}:{}:{}".format(self._uid_str(uid), sector, "A" if key_type == KEY_A else "B")
+
+    def candidates(self, uid, sector, key_types=(KEY_A, KEY_B)):
+        """
+        Genereer (key_type, sleutel) paren in de volgorde waarin ze geprobeerd moeten worden:
+        eerst de bekende sleutels van deze sector, dan sleutels die op deze kaart werkten,
+        dan het woordenboek op volgorde van treffers. Elke sleutel in de volgorde van key_types.
+        """
+        uid_str = self._uid_str(uid)
+        tried = set()
+        for key_type in key_types:
+            known = self.known.get(self._name(uid, sector, key_type))
+            if known is not None:
+                tried.add(known)
+                yield known
+        for key in self.card_keys.get(uid_str, []) + self.keys:
+            for key_type in key_types:
+                if (key_type, key) not in tried:
+                    tried.add((key_type, key))
+                    yield key_type, key
+
+    def add(self, key_hex):
+        """Voeg een (bijvoorbeeld met mfkey32 gevonden) sleutel vooraan het woordenboek toe."""
+        key = bytes.fromhex(key_hex)
+        if key in self.keys:
+            self.keys.remove(key)
+        self.keys.insert(0, key)
+        self.hits[key] = max(self.hits.get(key, 0), max(self.hits.values(), default=0))
+        self.dirty = True
+        self._sort()
+
+    def record(self, uid, sector, key_type, key):
+        """Registreer een geslaagde authenticatie."""
+        key = bytes(key)
+        uid_str = self._uid_str(uid)
+        name = self._name(uid, sector, key_type)
+        if self.known.get(name) != (key_type, key):
+            self.known[name] = (key_type, key)
+            self.dirty = True
+        keys = self.card_keys.setdefault(uid_str, [])
+        if key in keys:
+            keys.remove(key)
+        keys.insert(0, key)
+        self.clock += 1
+        self.used[uid_str] = self.clock
+        if len(self.card_keys) > MAX_CARDS:
+            self._forget(min(self.card_keys, key=lambda u: self.used.get(u, 0)))
+        self.hits[key] = self.hits.get(key, 0) + 1
+        self._pending_hits += 1
+        if self._pending_hits >= HITS_FLUSH_EVERY:
+            self.dirty = True
+        if key not in self.keys:
+            self.keys.append(key)
+        self._sort()
+
+    def _forget(self, uid_str):
+        """Vergeet de sleutels van een kaart (de langst niet gebruikte, zie MAX_CARDS)."""
+        prefix = uid_str + ":"
+        for name in [n for n in self.known if n.startswith(prefix)]:
+            del self.known[name]
+        self.card_keys.pop(uid_str, None)
+        self.used.pop(uid_str, None)
+        self.dirty = True
+        debug_print("Sleutelcache: kaart vergeten (LRU): " + uid_str)
+
+    def _sort(self):
+        # Meeste treffers eerst
+        self.keys.sort(key=lambda k: -self.hits.get(k, 0))
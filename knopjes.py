@@ -1,12 +1,12 @@
-import time
-import micropython
+import uasyncio as asyncio
 import hardware_setup
 from machine import Pin
 
 # Globale menu variabelen
 menu_active = False
-menu_options = ["Discard", "Emulate", "Crack"]
+menu_options = ["Discard", "Emulate", "Crack", "Stop"]
 current_menu_index = 0
+_pressed = asyncio.ThreadSafeFlag()  # Gezet vanuit de pin-IRQ, afgehandeld in button_task
 
 class Button:
     def __init__(self, row, col, width, height, text, callback, litcolor=1):
@@ -19,6 +19,7 @@ class Button:
         self.litcolor = litcolor
         self.bgcolor = 0
         self.fgcolor = 1
+        self.pressed = False
 
     def show(self):
         hardware_setup.ssd.fill_rect(self.col, self.row, self.width, self.height, self.bgcolor)
@@ -28,10 +29,10 @@ class Button:
         hardware_setup.ssd.text(self.text, x_text, y_text, self.fgcolor)
         hardware_setup.ssd.show()
 
-    def do_sel(self):
+    async def do_sel(self):
         self.bgcolor = self.litcolor
         self.show()
-        time.sleep(0.2)
+        await asyncio.sleep_ms(200)
         self.bgcolor = 0
         self.show()
         self.callback(self)
@@ -60,7 +61,7 @@ def next_pressed(btn):
         current_menu_index = (current_menu_index + 1) % len(menu_options)
         update_menu_display()
 
-def confirm_pressed(btn, emulate_callback, crack_callback, discard_callback, resume_callback):
+def confirm_pressed(btn, emulate_callback, crack_callback, discard_callback, resume_callback, cancel_callback=None):
     global menu_active, current_menu_index
     if menu_active:
         selected = menu_options[current_menu_index]
@@ -70,17 +71,23 @@ def confirm_pressed(btn, emulate_callback, crack_callback, discard_callback, res
             emulate_callback()
         elif selected == "Crack":
             crack_callback()
+        elif selected == "Stop" and cancel_callback:
+            cancel_callback()
         menu_active = False
         if resume_callback:
             resume_callback()
 
 def setup_button_irqs(btn_menu, btn_next, btn_confirm):
+    # De IRQ markeert alleen de knop; button_task doet de rest buiten de interrupt
     def menu_irq(pin):
-        micropython.schedule(lambda _: btn_menu.do_sel(), 0)
+        btn_menu.pressed = True
+        _pressed.set()
     def next_irq(pin):
-        micropython.schedule(lambda _: btn_next.do_sel(), 0)
+        btn_next.pressed = True
+        _pressed.set()
     def confirm_irq(pin):
-        micropython.schedule(lambda _: btn_confirm.do_sel(), 0)
+        btn_confirm.pressed = True
+        _pressed.set()
     phys_sw_menu = Pin(26, Pin.IN, Pin.PULL_UP)
     phys_sw_next = Pin(27, Pin.IN, Pin.PULL_UP)
     phys_sw_confirm = Pin(28, Pin.IN, Pin.PULL_UP)
@@ -97,3 +104,12 @@ def create_buttons(menu_cb, next_cb, confirm_cb):
     btn_confirm.show()
     setup_button_irqs(btn_menu, btn_next, btn_confirm)
     return btn_menu, btn_next, btn_confirm
+
+async def button_task(buttons):
+    """uasyncio-taak die ingedrukte knoppen afhandelt zonder de andere taken op te houden."""
+    while True:
+        await _pressed.wait()
+        for btn in buttons:
+            if btn.pressed:
+                btn.pressed = False
+                await btn.do_sel()
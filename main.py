@@ -1,42 +1,39 @@
-import time
-import micropython
+import uasyncio as asyncio
 import json
-from machine import Timer
 import hardware_setup
 from display import Display, debug_print
 from nfc_module import NFCModule
-from knopjes import create_buttons, menu_pressed, next_pressed, confirm_pressed
+import knopjes
+from knopjes import create_buttons, menu_pressed, next_pressed, confirm_pressed, button_task
 from wifichip import WiFiChip
+from jobs import JobScheduler, QUEUED, RUNNING
 
 # Globale variabelen
 DEBUG = True
-menu_active = False  # Wordt gebruikt om de kaartdetectie tijdelijk te pauzeren tijdens menu-activiteit
+POLL_PERIOD_MS = 100  # Niet-blokkerende check op het InAutoPoll-resultaat van de PN532
 
 # Initialiseer NFC-module
 nfc = NFCModule()
 
+# Lange NFC-operaties draaien als jobs; voortgang gaat naar de OLED en /jobs/<id>
+def show_job(job):
+    if job.state == RUNNING:
+        Display.update_status("{} #{}\n{}%\n{}".format(job.name, job.id, job.progress, job.message))
+    else:
+        Display.update_status("{} #{}\n{}".format(job.name, job.id, job.state))
+    if job.state not in (QUEUED, RUNNING):
+        nfc.events.publish("job", id=job.id, naam=job.name, status=job.state, resultaat=job.result)
+
+jobs = JobScheduler(on_update=show_job)
+
 # Initialiseer WiFiChip en koppel de NFC-module
 wifi = WiFiChip()
 wifi.set_nfc(nfc)
-
-# Stel de UART IRQ in zodat de WiFiChip zijn eigen process_uart kan aanroepen
-wifi.uart.irq(handler=wifi.uart_irq_handler, trigger=wifi.uart.IRQ_RXIDLE, hard=False)
+wifi.set_jobs(jobs)
 
 # Cache voor de homepagina (indien gewenst)
 cached_homepage = None
 
-# Kaartdetectie via Timer
-nfc_poll_timer = Timer(-1)
-def poll_for_card(timer):
-    # Geef de huidige menu-status door, zodat tijdens een menu geen nieuwe kaart wordt ingelezen
-    nfc.process_card_detection(menu_active)
-
-nfc_poll_timer.init(period=1000, mode=Timer.PERIODIC, callback=lambda t: micropython.schedule(poll_for_card, 0))
-
-# # Heartbeat Timer
-# heartbeat_timer = Timer(-1)
-# heartbeat_timer.init(period=1000, mode=Timer.PERIODIC, callback=lambda t: debug_print("Heartbeat tick"))
-
 # Callback-functies voor de knoppen
 def discard_card():
     nfc.current_card_info = None
@@ -46,29 +43,35 @@ def discard_card():
     Display.show_ip(wifi.ap_ip)
 
 
+# Emuleren en kraken duren lang: als job, zodat webserver en knoppen doorlopen
 def emulate_card_callback():
-    nfc.emulate_card()
-    
+    jobs.submit("emulate", nfc.emulate_card)
+
 def crack_card_callback():
-    nfc.send_card_data_for_cracking()
+    jobs.submit("crack", nfc.crack_job)
 
-def resume_polling():
-    nfc_poll_timer.init(period=1000, mode=Timer.PERIODIC, callback=lambda t: micropython.schedule(poll_for_card, 0))
+def cancel_job_callback():
+    if not jobs.cancel():
+        Display.update_status("Geen job actief")
 
 # Maak de fysieke knoppen aan via knopjes.py
 btn_menu, btn_next, btn_confirm = create_buttons(
     menu_pressed,
     next_pressed,
-    lambda btn: confirm_pressed(btn, emulate_card_callback, crack_card_callback, discard_card, resume_polling)
+    lambda btn: confirm_pressed(btn, emulate_card_callback, crack_card_callback, discard_card, None,
+                                cancel_job_callback)
 )
 
-def main():
+async def main():
     debug_print("Starting main initialization.")
-    wifi.setup()
-    wifi.ask_ip()
+    await wifi.setup()
+    await wifi.ask_ip()
     print("Initialisatie voltooid. Wacht op binnenkomende verbindingen...")
-    while True:
-        time.sleep(2)
+    # Kaartdetectie pauzeert zolang het menu open is
+    asyncio.create_task(nfc.card_detection_task(lambda: knopjes.menu_active, POLL_PERIOD_MS))
+    asyncio.create_task(button_task((btn_menu, btn_next, btn_confirm)))
+    asyncio.create_task(jobs.run())
+    await wifi.serve()
 
 if __name__ == "__main__":
-    main()
+    asyncio.run(main())
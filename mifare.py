@@ -0,0 +1,113 @@
+"""
+Indeling van MIFARE Classic kaarten.
+
+1K: 16 sectoren van 4 blokken.
+4K: 32 sectoren van 4 blokken, gevolgd door 8 sectoren (32-39) van 16 blokken.
+Het laatste blok van elke sector is de sector trailer (sleutels + access bits).
+"""
+
+SAK_CLASSIC_1K = 0x08
+SAK_CLASSIC_4K = 0x18
+
+BLOCK_SIZE = 16
+
+
+def sector_count(sak):
+    """Aantal sectoren voor de kaart met deze SAK (standaard 1K)."""
+    return 40 if sak == SAK_CLASSIC_4K else 16
+
+
+def block_count(sector):
+    """Aantal blokken in een sector."""
+    return 4 if sector < 32 else 16
+
+
+def first_block(sector):
+    """Nummer van het eerste blok van een sector."""
+    if sector < 32:
+        return sector * 4
+    return 128 + (sector - 32) * 16
+
+
+def trailer_block(sector):
+    """Nummer van de sector trailer."""
+    return first_block(sector) + block_count(sector) - 1
+
+
+def sector_of(block):
+    """Sector waar een bloknummer in valt."""
+    if block < 128:
+        return block // 4
+    return 32 + (block - 128) // 16
+
+
+def total_blocks(sak):
+    """Totaal aantal blokken op de kaart (64 voor 1K, 256 voor 4K)."""
+    return 256 if sak == SAK_CLASSIC_4K else 64
+
+
+# -------------------- Access conditions --------------------
+
+KEY_A = 0x60
+KEY_B = 0x61
+
+_AB = (KEY_A, KEY_B)
+_A = (KEY_A,)
+_B = (KEY_B,)
+
+# Leesrechten per access-waarde (C1 C2 C3 als 3-bit getal) voor datablokken...
+_DATA_READ = (_AB, _AB, _AB, _B, _AB, _B, _AB, ())
+# ...en voor de trailer (alleen access bits en eventueel key B; key A leest altijd 0)
+_TRAILER_READ = (_A, _A, _A, _AB, _AB, _AB, _AB, _AB)
+# Trailer-condities waarin key B leesbaar is: dan is key B geen sleutel maar data
+_KEY_B_READABLE = (0b000, 0b001, 0b010)
+
+
+def decode_access_bits(trailer):
+    """
+    Decodeer de access bits (bytes 6-8) van een sector trailer.
+    Retourneert een tuple met de 3-bit waarde (C1 C2 C3) voor groep 0-2 en de
+    trailer (groep 3), of None als de bits niet kloppen met hun inverse.
+    """
+    if trailer is None or len(trailer) < 9:
+        return None
+    b6, b7, b8 = trailer[6], trailer[7], trailer[8]
+    access = []
+    for g in range(4):
+        c1 = b7 >> (4 + g) & 1
+        c2 = b8 >> g & 1
+        c3 = b8 >> (4 + g) & 1
+        if (b6 >> g & 1) == c1 or (b6 >> (4 + g) & 1) == c2 or (b7 >> g & 1) == c3:
+            return None
+        access.append(c1 << 2 | c2 << 1 | c3)
+    return tuple(access)
+
+
+def access_group(sector, index):
+    """Access-groep (0-3) van het index-de blok binnen een sector."""
+    count = block_count(sector)
+    if index == count - 1:
+        return 3
+    if count == 4:
+        return index
+    return index // 5
+
+
+def plan_reads(sector, access):
+    """
+    Bepaal per blok van de sector met welke sleutel(s) het gelezen kan worden,
+    in volgorde van voorkeur. Een lege tuple betekent: nooit leesbaar, niet proberen.
+    Zonder (geldige) access bits wordt alles met beide sleutels geprobeerd.
+    """
+    count = block_count(sector)
+    if access is None:
+        return [_AB] * count
+    key_b_is_data = access[3] in _KEY_B_READABLE
+    plan = []
+    for i in range(count):
+        g = access_group(sector, i)
+        keys = _TRAILER_READ[access[3]] if g == 3 else _DATA_READ[access[g]]
+        if key_b_is_data:
+            keys = tuple(k for k in keys if k != KEY_B)
+        plan.append(keys)
+    return plan
@@ -1,97 +1,306 @@
 import time
 import json
+import gc
+import uasyncio as asyncio
 from machine import I2C, Pin
 from i2c import PN532_I2C
 from display import Display, debug_print
+import crypto1
+from keydict import KeyDictionary
+import mifare
+from cardcache import CardSnapshot
+from cardimage import CardImage
+from dumpstore import DumpStore
+from dumpstream import OledProgress, SnapshotFeed, FlashStore
+from events import EventFeed
+
+PN532_IRQ_PIN = 6  # GPIO van de IRQ-lijn van de PN532; None (of geen reactie op de pin) = status pollen via I2C
+PRESENCE_CHECK_MS = 1000  # Hoe vaak gekeken wordt of de gecachte kaart nog in het veld ligt
+
+
+async def _step(job, progress=None, message=None):
+    """Eén stap van een lange operatie: voortgang naar de job (indien aanwezig) en de loop vrijgeven."""
+    if job is None:
+        await asyncio.sleep_ms(0)
+    else:
+        await job.step(progress, message)
 
-COMMAND_INLISTPASSIVETARGET = 0x4A
 
 class NFCModule:
     def __init__(self):
         self.i2c = I2C(0, scl=Pin(5), sda=Pin(4))
-        self.pn532 = PN532_I2C(self.i2c, debug=True)
+        irq = Pin(PN532_IRQ_PIN, Pin.IN, Pin.PULL_UP) if PN532_IRQ_PIN is not None else None
+        self.pn532 = PN532_I2C(self.i2c, irq=irq)
         self.pn532.SAM_configuration()
-        self.cached_card_data = None  # Cache voor volledige kaartdata
+        self.cached_card_data = None  # CardImage van de huidige kaart (kan nog deels ongelezen zijn)
+        self.store = DumpStore()  # Eerder gelezen kaarten op flash, per UID
         self.current_card_uid = None
         self.current_card_atqa = None
         self.current_card_sak = None
         self.current_card_info = None
         self.current_card_type = None
+        self.snapshot = CardSnapshot()  # Wat de webserver over de kaart te zien krijgt
+        self.events = EventFeed()  # Kaart/dump/sleutel-gebeurtenissen voor de long-poll op /events
+        self.card_present = False  # Antwoordt de gecachte kaart nog? (zie _check_presence)
+        self._presence_checked = 0
+        self.keys = KeyDictionary()  # Sleutelwoordenboek + gevonden sleutels per (UID, sector)
+        self.keys.load("keys.txt")
+        self.keys.load_cache()
+        self.lock = asyncio.Lock()  # De PN532 is gedeeld tussen kaartdetectie en webverzoeken
+        # Krijgen elke gelezen sector meteen (zie stream_card)
+        self.dump_consumers = [OledProgress(), SnapshotFeed(self.snapshot, self.events), FlashStore(self.store)]
         # Eventuele extra initialisaties...
 
 
-    def get_mfkey32_data_table(self):
+    async def read_full_card_async(self, job=None, image=None, sectors=None):
         """
-        Haal de volledige mfkey32-data op en retourneer deze als een HTML-tabel.
-        De data moet de volgende velden bevatten: uid, nt, nr0, ar0, nt1, nr1, ar1.
+        Lees de kaart (of de gevraagde, nog ontbrekende sectoren van image) zonder
+        de event loop te blokkeren: na elke sleutelpoging en elk blok krijgen de
+        webserver en de knoppen weer de beurt. Moet onder self.lock draaien.
         """
-        data = self.get_mfkey32_data()  # Zorg dat deze functie een dict retourneert met de vereiste velden
-        if data is None:
-            return "<p>Geen kaartdata beschikbaar.</p>"
-        
-        html = "<table>"
-        html += "<tr><th>Parameter</th><th>Waarde</th></tr>"
-        html += f"<tr><td>UID</td><td>{data.get('uid','')}</td></tr>"
-        html += f"<tr><td>NT</td><td>{data.get('nt','')}</td></tr>"
-        html += f"<tr><td>NR0</td><td>{data.get('nr0','')}</td></tr>"
-        html += f"<tr><td>AR0</td><td>{data.get('ar0','')}</td></tr>"
-        html += f"<tr><td>NT1</td><td>{data.get('nt1','')}</td></tr>"
-        html += f"<tr><td>NR1</td><td>{data.get('nr1','')}</td></tr>"
-        html += f"<tr><td>AR1</td><td>{data.get('ar1','')}</td></tr>"
-        html += "</table>"
-        return html
-
-    def read_full_card(self):
-        """Leest de volledige kaart uit (MIFARE Classic 1K) – behoudt je bestaande methode."""
-        card_dump = {}
+        total = len(image.missing_sectors(sectors)) if image is not None else mifare.sector_count(self.current_card_sak)
+        card_dump = image
+        done = 0
+        stream = self.stream_card(image, sectors)
         try:
-            uid = self.pn532.read_passive_target(timeout=1000)
-        except Exception as e:
-            debug_print("Error reading UID: " + str(e))
-            return None
+            for step in stream:
+                if step is None:
+                    await _step(job)  # Tussen twee sleutelpogingen of blokken
+                    continue
+                card_dump, sector, _ = step
+                done += 1
+                await _step(job, min(99, 100 * done // max(1, total)), "Sector {}".format(sector))
+        finally:
+            stream.close()  # Ook bij annuleren: de afnemers krijgen hun end()
+        return card_dump
+
+    async def dump_job(self, job):
+        """
+        Job: lees de kaart opnieuw volledig uit; de snapshot volgt per sector. Er
+        wordt in een kopie van de bestaande dump gelezen, zodat een afgebroken
+        dump niets kwijtmaakt van wat er al was.
+        """
+        async with self.lock:
+            cached = self.cached_card_data
+            image = cached.copy(keep_loaded=False) if cached is not None else None
+            card_dump = await self.read_full_card_async(job, image)
+            if card_dump is None or len(card_dump.missing_sectors()) == card_dump.sector_count:
+                raise RuntimeError("Geen kaart gevonden")
+            if cached is not None and self.cached_card_data is cached:
+                self.cached_card_data = card_dump
+        return card_dump.stats
+
+    async def load_sectors(self, sectors=None, job=None):
+        """
+        Zorg dat de gevraagde sectoren (standaard alle) van de huidige kaart in
+        cached_card_data staan. Na detectie is er alleen de UID; een sector wordt
+        pas geauthenticeerd en gelezen als iemand (webpagina, export, kraken) hem
+        nodig heeft. Sleutels van eerdere bezoeken gaan via de KeyDictionary voor.
+        Retourneert de CardImage, of None zonder kaart.
+        """
+        image = self.cached_card_data
+        if image is None or not image.missing_sectors(sectors):
+            return image
+        async with self.lock:
+            # Wie op de lock wachtte kan zijn sectoren intussen al gekregen hebben
+            if image is self.cached_card_data and image.missing_sectors(sectors):
+                await self.read_full_card_async(job, image, sectors)
+        return image
+
+    def stream_card(self, image=None, sectors=None):
+        """
+        Lees de kaart als stroom van sectoren. Generator: levert (image, sector, gelukt)
+        op zodra een sector gelezen is en de dump_consumers (OLED, snapshot, flash) hem
+        hebben, en None tussen twee sleutelpogingen of blokken. Zonder image wordt de kaart vers in een nieuwe CardImage gelezen, die
+        meteen cached_card_data wordt; anders alleen de ontbrekende sectoren (uit
+        sectors, standaard alle). Verdwijnt de kaart of wordt de stroom gesloten, dan
+        blijft alles wat al gelezen was bewaard.
+        """
+        uid = self._select_card()
         if uid is None:
             print("Geen kaart gevonden.")
+            return
+        if image is None:
+            image = CardImage(uid, self.current_card_sak, self.current_card_atqa)
+            self.cached_card_data = image
+        elif bytes(uid) != image.uid:
+            return
+        todo = image.missing_sectors(sectors)
+        print("Kaart UID:", ' '.join("{:02X}".format(x) for x in uid), "- sectoren:", len(todo))
+        self._notify("start", image, todo)
+        start = time.ticks_ms()
+        blocks_read = 0  # In deze ronde; de statistiek telt alle rondes op
+        finished = False
+        try:
+            for sector in todo:
+                ok = yield from self._load_sector_steps(image, sector)
+                if ok:
+                    blocks_read += image.blocks_read(sector)
+                self._notify("sector", image, sector, ok)
+                yield image, sector, ok
+                if not ok and not self.pn532.target_selected:
+                    print("Kaart uit het veld; gestopt na sector", sector)
+                    return
+            finished = True
+        finally:
+            if blocks_read:
+                image.add_stats(blocks_read, time.ticks_diff(time.ticks_ms(), start))
+            if finished and image.complete() and image.stats is not None:
+                print("Dump klaar: {} blokken in {} ms ({} blokken/s)".format(
+                    image.stats['blocks'], image.stats['ms'], image.stats['blocks_per_s']))
+            self.keys.save_cache()
+            self._notify("end", image, finished)
+
+    def _notify(self, event, *args):
+        for consumer in self.dump_consumers:
+            try:
+                getattr(consumer, event)(*args)
+            except Exception as e:
+                debug_print("Dump-afnemer {} mislukt: {}".format(event, e))
+
+    def _select_card(self):
+        """Zorg dat de huidige kaart geselecteerd is; retourneert de UID of None."""
+        try:
+            # Na detectie via InAutoPoll (of een aanwezigheidscheck) is de kaart al geselecteerd
+            if self.pn532.target_selected and self.pn532.target_uid == self.current_card_uid:
+                return self.current_card_uid
+            if self.current_card_uid is not None and self.pn532.reselect_target(self.current_card_uid):
+                return self.current_card_uid
+            return self.pn532.read_passive_target(timeout=1000)
+        except Exception as e:
+            debug_print("Error reading UID: " + str(e))
             return None
-        uid_str = ' '.join("{:02X}".format(x) for x in uid)
-        print("Kaart UID:", uid_str)
-        card_dump['uid'] = uid
-        sectors = {}
-        SECTORS = 16
-        BLOCKS_PER_SECTOR = 4
-        DEFAULT_KEY_A = b'\xFF\xFF\xFF\xFF\xFF\xFF'
-        for sector in range(SECTORS):
-            trailer_block = (sector + 1) * BLOCKS_PER_SECTOR - 1
-            print(f"Authenticatie voor sector {sector} (trailer block {trailer_block})...")
+
+    def _load_sector_steps(self, image, sector):
+        """
+        Authenticeer en lees één sector in image. Generator: levert None na elke
+        authenticatiepoging en elk gelezen blok, zodat een async lezer de event loop
+        tussendoor vrij kan geven. Resultaat: True als de sector open ging.
+        """
+        trailer_block = mifare.trailer_block(sector)
+        print(f"Authenticatie voor sector {sector} (trailer block {trailer_block})...")
+        found = yield from self._authenticate_steps(image.uid, sector, trailer_block)
+        if found is not None:
+            image.set_key(sector, *found)
+            yield from self._read_sector_steps(image.uid, sector, found, image)
+        # Alleen als de kaart er nog is: een sector die mislukte omdat de kaart
+        # weggehaald werd, wordt de volgende keer opnieuw geprobeerd
+        if self.pn532.target_selected:
+            image.mark_loaded(sector)
+        if found is None:
+            print(f"  Authenticatie mislukt voor sector {sector}.")
+            return False
+        return True
+
+    def _read_sector_steps(self, uid, sector, found, image):
+        """
+        Lees alle blokken van een sector die al geauthenticeerd is met found = (key_type, sleutel),
+        rechtstreeks in de buffer van image (een CardImage). Eerst wordt de trailer
+        gelezen; de access bits bepalen daarna per blok met welke sleutel het leesbaar
+        is, zodat er geen reads of authenticaties worden geprobeerd die zeker mislukken (elke mislukking kost een re-select en een timeout).
+        Generator: levert None na elk blok.
+        """
+        count = mifare.block_count(sector)
+        first = mifare.first_block(sector)
+        trailer_block = first + count - 1
+        trailer = image.view(trailer_block)
+        if self.pn532.mifare_classic_read_block_into(trailer_block, trailer):
+            image.mark_valid(trailer_block)
+        elif not (self.pn532.reselect_target(uid) and
+                  self.pn532.mifare_classic_authenticate_block(uid, trailer_block, *found)):
+            return
+        yield
+        plan = mifare.plan_reads(sector, mifare.decode_access_bits(image.block(trailer_block)))
+        key_type = found[0]
+        todo = [i for i in range(count - 1) if plan[i]]  # Nooit leesbare blokken vallen hier al af
+        for _ in range(2):
+            later = []
+            for i in todo:
+                if key_type not in plan[i]:
+                    later.append(i)
+                    continue
+                data = image.view(first + i)
+                if self.pn532.mifare_classic_read_block_into(first + i, data):
+                    image.mark_valid(first + i)
+                    debug_print("  Blok {:3d}: {}".format(first + i, ' '.join("{:02X}".format(b) for b in data)))
+                    yield
+                    continue
+                # Geweigerd ondanks het plan: kaart staat in HALT, opnieuw authenticeren
+                if not (self.pn532.reselect_target(uid) and
+                        self.pn532.mifare_classic_authenticate_block(uid, trailer_block, *found)):
+                    return
+                yield
+            if not later:
+                break
+            # De overgebleven blokken zijn alleen met de andere sleutel leesbaar
+            other = mifare.KEY_B if key_type == mifare.KEY_A else mifare.KEY_A
+            found = yield from self._authenticate_steps(uid, sector, trailer_block, key_types=(other,))
+            if found is None:
+                break
+            image.set_key(sector, *found)
+            key_type = other
+            todo = later
+
+    def _authenticate_steps(self, uid, sector, block, key_types=(mifare.KEY_A, mifare.KEY_B)):
+        """
+        Probeer de sleutels uit het woordenboek (A en B) op een block van deze sector.
+        Generator: levert None na elke mislukte poging. Resultaat: (key_type, sleutel)
+        bij succes, anders None. Na een mislukte authenticatie selecteert de
+        PN532-laag de kaart direct opnieuw.
+        """
+        for key_type, key in self.keys.candidates(uid, sector, key_types):
             try:
-                auth_success = self.pn532.mifare_classic_authenticate_block(uid, trailer_block, 0x60, DEFAULT_KEY_A)
+                if self.pn532.mifare_classic_authenticate_block(uid, block, key_type, key):
+                    self.keys.record(uid, sector, key_type, key)
+                    return key_type, key
             except Exception as e:
                 debug_print("Auth exception in sector {}: {}".format(sector, e))
-                continue
-            if not auth_success:
-                print(f"  Authenticatie mislukt voor sector {sector}.")
-                continue
-            trailer = self.pn532.mifare_classic_read_block(trailer_block)
-            first_data_block = sector * BLOCKS_PER_SECTOR
-            data_block = self.pn532.mifare_classic_read_block(first_data_block)
-            sectors[sector] = {'trailer': trailer, 'data': data_block}
-            print("  Trailer:", ' '.join("{:02X}".format(b) for b in trailer))
-            if data_block:
-                print("  Data   :", ' '.join("{:02X}".format(b) for b in data_block))
-        card_dump['sectors'] = sectors
-        return card_dump
+                self.pn532.reselect_target(uid)
+            # De PN532 heeft de kaart na de mislukte poging al opnieuw geselecteerd
+            if not self.pn532.target_selected:
+                debug_print("Kaart niet meer gevonden na mislukte authenticatie.")
+                return None
+            yield
+        return None
 
-    def send_card_data_for_cracking(self):
-        card_dump = self.read_full_card()
-        if card_dump:
-            data_json = json.dumps(card_dump)
-            Display.update_status("Kaartdata voor mfkey32 verzonden!")
-            print("Kaartdata voor mfkey32:", data_json)
-            return data_json
-        else:
+    async def send_card_data_for_cracking(self, job=None):
+        """
+        Vul de snapshot met alles wat nodig is om te kraken: een volledige dump en
+        twee opgevangen authenticaties voor mfkey32. In target mode speelt de
+        Hackbat zelf de tag, dus {at} komt nooit van de lezer: een trace voor
+        mfkey64 moet van een sniffer komen (set_mfkey64_trace).
+        """
+        if await self.load_sectors() is None:
+            Display.update_status("Capture failed!")
+            return None
+        await _step(job, 50, "Authenticaties opvangen (mfkey32)")
+        if await self.get_mfkey32_data() is None:
             Display.update_status("Capture failed!")
             return None
+        Display.update_status("Kaartdata voor mfkey32 verzameld!")
+        return self.snapshot.json()
+
+    async def capture_job(self, job):
+        """Job: dump + authenticaties opvangen voor de snapshot."""
+        if await self.send_card_data_for_cracking(job) is None:
+            raise RuntimeError("Opvangen mislukt")
+        return {"mfkey64": self.snapshot.mfkey64 is not None, "mfkey32": self.snapshot.mfkey32 is not None}
+
+    async def crack_job(self, job):
+        """Job: vang zo nodig eerst authenticaties op en bereken dan de sleutel."""
+        if self.snapshot.mfkey32 is None:
+            await self.capture_job(job)
+        return await self.run_mfkey32(job=job)
+
+    async def mfkey_job(self, job):
+        """Job: bereken de sleutel uit de al verzamelde data in de snapshot."""
+        return await self.run_mfkey32(job=job)
+
+    async def emulate_card(self, job=None):
+        async with self.lock:
+            await self._emulate_card()
 
-    def emulate_card(self):
+    async def _emulate_card(self):
         if self.current_card_uid and self.current_card_atqa and self.current_card_sak:
             uid_str = ' '.join("{:02X}".format(x) for x in self.current_card_uid)
             Display.update_status("Emulating:\n" + uid_str)
@@ -103,51 +312,114 @@ class NFCModule:
             params.append(len(self.current_card_uid))
             params.extend(self.current_card_uid)
             try:
-                response = self.pn532.tginitastarget(params, timeout=1000)
+                response = await self.pn532.tginitastarget_async(params, timeout=1000)
                 print("Target mode started, response:", response)
             except RuntimeError as e:
                 if "Received unexpected command response" in str(e):
                     print("Target mode started (ignoring error).")
                 else:
                     print("Error starting target mode:", e)
-            time.sleep(0.3)
+            await asyncio.sleep_ms(300)
         else:
             Display.update_status("Geen kaart UID!")
 
+    def _detect_card(self, menu_active):
+        """
+        Controleer zonder te blokkeren of de PN532 (via InAutoPoll) een kaart gevonden heeft.
+        De PN532 pollt zelf; zolang er geen kaart is kost dit alleen een statuscheck.
+        Retourneert True als er een nieuwe kaart is (de current_card_* velden zijn dan gevuld).
+        """
+        if self.cached_card_data is not None or menu_active:
+            return False
+        if not self.pn532.autopolling:
+            self.pn532.start_autopoll()
+            return False
+        found = self.pn532.read_autopoll()
+        if found is None:
+            return False
+        uid, self.current_card_atqa, self.current_card_sak = found
+        self.current_card_uid = uid
+        card_type_map = {"0x8": "MIFARE Classic 1K",
+                         "0x18": "MIFARE Classic 4K",
+                         "0x0":  "MIFARE Ultralight",
+                         "0x4":  "MIFARE Ultralight",
+                         "0x10": "MIFARE Plus",
+                         "0x28": "MIFARE DESFire"}
+        self.current_card_type = card_type_map.get(hex(self.current_card_sak), "Unknown")
+        uid_str = ' '.join("{:02X}".format(x) for x in uid)
+        atqa_str = ' '.join("{:02X}".format(x) for x in self.current_card_atqa)
+        self.current_card_info = "UID: " + uid_str + "\nATQA: " + atqa_str + "\nType: " + self.current_card_type
+        # Nieuwe kaart: oude dump, nonces en sleutel horen er niet meer bij
+        self.snapshot.update(card={"uid": bytes(uid).hex(), "atqa": bytes(self.current_card_atqa).hex(),
+                                   "sak": self.current_card_sak, "type": self.current_card_type},
+                             dump=None, mfkey32=None, mfkey64=None, key=None)
+        self.card_present = True
+        self._presence_checked = time.ticks_ms()
+        self.events.publish("kaart", kaart=self.snapshot.card)
+        print("Found card with UID:", uid_str, "ATQA:", atqa_str, "Type:", self.current_card_type)
+        return True
+
     def process_card_detection(self, menu_active):
+        """
+        Detecteer een kaart en toon hem direct. Er wordt niets gelezen: een bekende
+        kaart krijgt zijn dump van flash, een nieuwe een lege CardImage die
+        sector voor sector gevuld wordt zodra iemand erom vraagt (load_sectors).
+        """
         try:
-            if self.cached_card_data is not None:
-                return
-            if not self.pn532.listen_for_passive_target(timeout=500) or menu_active:
-                return
-            response = self.pn532.process_response(COMMAND_INLISTPASSIVETARGET, 30, 500)
-            if response is None or response[0] != 0x01:
-                return
-            uid_len = response[5]
-            if uid_len > 7:
-                raise RuntimeError("Kaart met te lange UID gevonden!")
-            uid = response[6:6+uid_len]
-            self.current_card_uid = uid
-            self.current_card_atqa = response[2:4]
-            self.current_card_sak = response[4]
-            uid_str = ' '.join("{:02X}".format(x) for x in uid)
-            atqa_str = ' '.join("{:02X}".format(x) for x in self.current_card_atqa)
-            card_type_map = {"0x8": "MIFARE Classic 1K",
-                             "0x18": "MIFARE Classic 4K",
-                             "0x0":  "MIFARE Ultralight",
-                             "0x4":  "MIFARE Ultralight",
-                             "0x10": "MIFARE Plus",
-                             "0x28": "MIFARE DESFire"}
-            self.current_card_type = card_type_map.get(hex(self.current_card_sak), "Unknown")
-            self.current_card_info = "UID: " + uid_str + "\nATQA: " + atqa_str + "\nType: " + self.current_card_type
-
-            self.cached_card_data = self.read_full_card()
-            Display.update_status(self.current_card_info)
-            print("Found card with UID:", uid_str, "ATQA:", atqa_str, "Type:", self.current_card_type)
+            if self._detect_card(menu_active):
+                self._open_card()
+                Display.update_status(self.current_card_info)
         except Exception as e:
             debug_print("Error reading card: " + str(e))
 
-    def capture_auth_data(self, block_number, timeout=2000):
+    async def process_card_detection_async(self, menu_active):
+        """Awaitable process_card_detection, voor card_detection_task."""
+        self.process_card_detection(menu_active)
+
+    def _open_card(self):
+        image = self.store.load(self.current_card_uid)
+        if image is not None:
+            self.cached_card_data = image
+            self.snapshot.update(dump=image)
+            self.events.publish("dump_klaar", uid=image.uid.hex(), stats=image.stats, bron="flash")
+        else:
+            self.cached_card_data = CardImage(self.current_card_uid, self.current_card_sak, self.current_card_atqa)
+            self.snapshot.update(dump=self.cached_card_data)
+
+    async def card_detection_task(self, is_paused, period_ms=100):
+        """
+        Kaartdetectie als uasyncio-taak. is_paused() geeft True zolang er niet
+        gelezen mag worden (bijvoorbeeld tijdens het menu).
+        """
+        while True:
+            if not self.lock.locked():
+                async with self.lock:
+                    await self.process_card_detection_async(is_paused())
+                    if not is_paused():
+                        await self._check_presence()
+            await asyncio.sleep_ms(period_ms)
+
+    async def _check_presence(self, interval_ms=PRESENCE_CHECK_MS):
+        """
+        Kijk af en toe of de gecachte kaart nog in het veld ligt (re-select op UID).
+        Is hij weg, dan volgt één "kaart_weg"-gebeurtenis; de dump blijft bewaard.
+        """
+        if not self.card_present or self.cached_card_data is None:
+            return
+        if time.ticks_diff(time.ticks_ms(), self._presence_checked) < interval_ms:
+            return
+        self._presence_checked = time.ticks_ms()
+        if not await self.pn532.reselect_target_async(self.current_card_uid):
+            self.card_present = False
+            self.events.publish("kaart_weg", uid=bytes(self.current_card_uid).hex(), reden="uit het veld")
+            Display.update_status("Kaart weg")
+
+    async def capture_auth_data(self, block_number, timeout=2000):
+        """Vang één authenticatie (nt, {nr}, {ar}) op in target mode."""
+        async with self.lock:
+            return await self._capture_auth_data(block_number, timeout)
+
+    async def _capture_auth_data(self, block_number, timeout):
         if self.current_card_uid is None:
             print("Geen kaart UID beschikbaar voor target mode capture.")
             return None
@@ -159,32 +431,32 @@ class NFCModule:
         params.append(len(self.current_card_uid)) # UID length (1 byte, bijv. 4)
         params.extend(self.current_card_uid)      # UID bytes
 
-        init_resp = self.pn532.tginitastarget(params, timeout=1000)
+        init_resp = await self.pn532.tginitastarget_async(params, timeout=1000)
         if init_resp is None:
             print("tginitastarget failed")
             return None
         print("tginitastarget response:", init_resp)
-        time.sleep(1)  # Even wachten op data
+        await asyncio.sleep_ms(1000)  # Even wachten op data
 
         raw_data = bytearray()
         start_time = time.ticks_ms()
         while time.ticks_diff(time.ticks_ms(), start_time) < timeout:
-            frame = self.pn532.tggetdata(timeout=500)
+            frame = await self.pn532.tggetdata_async(timeout=500)
             if frame is None or len(frame) == 0:
-                time.sleep_ms(100)
+                await asyncio.sleep_ms(100)
                 continue
             print("Ontvangen frame:", frame)
             raw_data.extend(frame)
             if len(raw_data) >= 12:  # Verwacht 12 bytes: 4 voor nt, 4 voor nr, 4 voor ar
                 break
-            time.sleep_ms(100)
+            await asyncio.sleep_ms(100)
         if len(raw_data) < 12:
             print("Niet genoeg data ontvangen in target mode.")
             return None
         print("Volledige target mode raw data:", raw_data)
         return raw_data
 
-    def get_mfkey32_data(self):
+    async def get_mfkey32_data(self):
         """
         Voer twee authentisatiepogingen (via target mode) uit op een bepaald block (bijv. block 3)
         en retourneer een dictionary met de benodigde data (uid, nt, nr0, ar0, nt1, nr1, ar1)
@@ -200,9 +472,9 @@ class NFCModule:
 
         # Probeer eerst één authentisatiepoging (bijvoorbeeld met target mode)
         print("Eerste authenticatiepoging (target mode)...")
-        auth1 = self.capture_auth_data(block_number)
+        auth1 = await self.capture_auth_data(block_number)
         print("Tweede authenticatiepoging (target mode)...")
-        auth2 = self.capture_auth_data(block_number)
+        auth2 = await self.capture_auth_data(block_number)
 
         if auth1 is None or auth2 is None:
             print("Authenticatie mislukt voor een of beide pogingen.")
@@ -231,16 +503,91 @@ class NFCModule:
         print("Verzamelde mfkey32-data:")
         for key, val in data.items():
             print(f"  {key}: {val}")
+        self.snapshot.update(mfkey32=data)
+        self.events.publish("nonces", methode="mfkey32", uid=data["uid"])
+        return data
+
+    def set_mfkey64_trace(self, trace):
+        """
+        Bewaar een volledige authenticatie (nt, {nr}, {ar}, {at}) voor mfkey64.
+        Die komt van een sniffer aan de kant van de lezer (bijvoorbeeld een
+        Proxmark): in target mode stuurt de lezer zelf nooit {at}. trace is een
+        dict met hex-strings nt, nr, ar, at en optioneel uid (standaard de
+        huidige kaart). Retourneert de opgeslagen data, of None als hij niet klopt.
+        """
+        uid = trace.get("uid")
+        if not uid and self.current_card_uid is not None:
+            uid = "".join("{:02X}".format(b) for b in self.current_card_uid)
+        data = {"uid": uid}
+        for key in ("nt", "nr", "ar", "at"):
+            data[key] = trace.get(key)
+        try:
+            for key, value in data.items():
+                int(value, 16)
+                if key != "uid" and len(value) != 8:
+                    raise ValueError(value)
+        except (TypeError, ValueError):
+            print("Ongeldige mfkey64-trace:", trace)
+            return None
+        data = {key: value.upper() for key, value in data.items()}
+        if data == self.snapshot.mfkey64:
+            return data  # Zelfde trace opnieuw (pagina herladen): niets veranderd
+        print("mfkey64-trace opgeslagen:", data)
+        self.snapshot.update(mfkey64=data)
+        self.events.publish("nonces", methode="mfkey64", uid=data["uid"])
         return data
 
-    def run_mfkey32(self):
-        print("RUNNING MFKEY32 with cached data:")
-        print(self.cached_card_data)
-        if self.cached_card_data is None:
+    async def run_mfkey32(self, data=None, job=None):
+        """
+        Herstel de sectorsleutel uit opgevangen authenticatiedata. Bevat de data
+        een volledige authenticatie (met 'at') dan wordt mfkey64 gebruikt, anders
+        mfkey32 met twee nonces. Zonder argument wordt de in de snapshot verzamelde
+        data gebruikt: eerst een gesniffte mfkey64-trace, en als die geen sleutel
+        oplevert de nonces voor mfkey32 (opgevangen via send_card_data_for_cracking,
+        menu "Crack"). De berekening loopt in stappen, met tussendoor de event loop vrij.
+        """
+        if data is None:
+            if self.snapshot.mfkey64 is not None:
+                result = await self._run_mfkey(self.snapshot.mfkey64, job)
+                if type(result) is dict or self.snapshot.mfkey32 is None:
+                    return result
+            data = self.snapshot.mfkey32
+        return await self._run_mfkey(data, job)
+
+    async def _run_mfkey(self, data, job):
+        print("RUNNING MFKEY with data:", data)
+        if data is None:
             return "Geen kaartdata beschikbaar voor mfkey32."
-        # Dummy resultaat; in een echte implementatie voer je de mfkey32-aanval uit met self.cached_card_data
-        result = {"key_a": "A0A1A2A3A4A5", "key_b": "B0B1B2B3B4B5"}
+        if "at" in data:
+            method, fields, attack = "mfkey64", ("uid", "nt", "nr", "ar", "at"), crypto1.mfkey64_steps
+        else:
+            method, fields, attack = "mfkey32", ("uid", "nt", "nr0", "ar0", "nt1", "nr1", "ar1"), crypto1.mfkey32_steps
+        try:
+            args = [int(data[k], 16) for k in fields]
+        except (KeyError, ValueError) as e:
+            return "Ongeldige {}-data: {}".format(method, e)
+        gc.collect()  # Zoveel mogelijk heap vrij voor de kandidaatlijsten
+        start = time.ticks_ms()
+        key = None
+        for progress, key in attack(*args):
+            if key is not None:
+                break
+            await _step(job, progress, method)
+        elapsed = time.ticks_diff(time.ticks_ms(), start)
+        gc.collect()
+        if key is None:
+            print("{}: geen sleutel gevonden ({} ms)".format(method, elapsed))
+            return "Geen sleutel gevonden."
+        result = {"uid": data["uid"], "key": crypto1.key_to_hex(key), "methode": method, "tijd_ms": elapsed}
+        self.keys.add(crypto1.key_to_hex(key))
+        self.snapshot.update(key=result)
+        self.events.publish("sleutel", **result)
+        print("mfkey resultaat:", result)
         return result
 
     def clear_cached_data(self):
         self.cached_card_data = None
+        self.snapshot.clear()
+        if self.card_present:
+            self.card_present = False
+            self.events.publish("kaart_weg", reden="gewist")
@@ -10,6 +10,7 @@ using I2C, SPI or UART.
 
 import time
 
+import uasyncio as asyncio
 from micropython import const
 from machine import Pin
 
@@ -62,6 +63,15 @@ _WAKEUP = const(0x55)
 
 _MIFARE_ISO14443A = const(0x00)
 
+# InAutoPoll target type: passive 106 kbps ISO/IEC14443-4A / MiFare
+_AUTOPOLL_MIFARE_106A = const(0x10)
+
+# RFConfiguration CfgItem 0x05 (MaxRetries): ATR retries, PSL retries and
+# passive-activation retries. The default 0xFF makes InListPassiveTarget retry
+# forever when the card is gone; a few retries let it answer "no target".
+_CFGITEM_MAX_RETRIES = const(0x05)
+_PASSIVE_ACTIVATION_RETRIES = const(0x03)
+
 # Mifare Commands
 MIFARE_CMD_AUTH_A = const(0x60)
 MIFARE_CMD_AUTH_B = const(0x61)
@@ -122,6 +132,10 @@ _GPIO_P35 = const(5)
 _ACK = b"\x00\x00\xFF\x00\xFF\x00"
 _FRAME_START = b"\x00\x00\xFF"
 
+# Largest normal information frame: 8 framing bytes + 255 data bytes, plus slack
+# for leading 0x00 bytes before the start code on reads.
+_FRAME_BUFFER_SIZE = const(8 + 255 + 8)
+
 
 class BusyError(Exception):
     """Base class for exceptions in this module."""
@@ -130,13 +144,36 @@ class BusyError(Exception):
 class PN532:
     """PN532 driver base, must be extended for I2C/SPI/UART interfacing"""
 
+    # Transport status bytes in front of every raw read (I2C: 1 status byte).
+    # _read_data_into leaves them in the buffer, the frame parser skips them.
+    _READ_PREFIX = 0
+
     def __init__(self, *, debug=False, irq=None, reset=None):
         """Create an instance of the PN532 class"""
         self.low_power = True
         self.debug = debug
         self._irq = irq
         self._reset_pin = reset
+        self.target_uid = None  # UID of the currently selected card (for re-select)
+        self.target_selected = False
+        # Preallocated frame buffers: a command round trip allocates nothing on the
+        # heap, responses are returned as memoryviews into _rx.
+        self._tx = bytearray(_FRAME_BUFFER_SIZE)
+        self._tx_view = memoryview(self._tx)
+        self._rx = bytearray(_FRAME_BUFFER_SIZE + self._READ_PREFIX)
+        self._rx_view = memoryview(self._rx)
+        self._ack = bytearray(len(_ACK) + self._READ_PREFIX)
+        self._block_params = bytearray(3)
+        # IRQ-driven readiness: the PN532 pulls IRQ low when an ACK or response
+        # is ready, so we wait on the pin instead of polling the status over I2C.
+        self._irq_flag = False
+        self.use_irq = False  # Wake up polled; the IRQ line is checked below
+        self.autopolling = False  # InAutoPoll active: the PN532 is looking for cards by itself
+        if irq is not None:
+            irq.irq(trigger=Pin.IRQ_FALLING, handler=self._irq_handler)
         self.reset()
+        if irq is not None:
+            self.use_irq = self._irq_responds()
         _ = self.firmware_version
 
 
@@ -177,6 +214,16 @@ class PN532:
         # Subclasses MUST implement this!
         raise NotImplementedError
 
+    def _read_data_into(self, buf):
+        # Read raw data into a preallocated buffer (memoryview), starting with
+        # the _READ_PREFIX transport status bytes, and return the number of
+        # bytes in buf. Subclasses SHOULD override this with a readinto-style
+        # bus call; the default falls back to _read_data and copies.
+        data = self._read_data(len(buf))
+        count = len(data)
+        buf[:count] = data
+        return count
+
     def _wait_ready(self, timeout):
         # Check if busy up to max length of 'timeout' milliseconds
         # Subclasses MUST implement this!
@@ -186,6 +233,62 @@ class PN532:
         # Send special command to wake up
         raise NotImplementedError
 
+    def _irq_handler(self, pin):  # pylint: disable=unused-argument
+        # Runs in (hard) interrupt context: only set a flag, no allocation.
+        self._irq_flag = True
+
+    def _wait_response(self, timeout):
+        """Wait until the PN532 has an ACK or response ready. Uses the IRQ line
+        when available (returns as soon as the edge arrives, the bus stays idle
+        meanwhile) and falls back to the transport's polled _wait_ready."""
+        if not self.use_irq:
+            return self._wait_ready(timeout)
+        start = time.ticks_ms()
+        while not self._irq_flag and self._irq.value():
+            if time.ticks_diff(time.ticks_ms(), start) >= timeout:
+                return False
+            time.sleep_us(50)
+        # Clear before the read: reading releases IRQ, the next edge is the next frame.
+        self._irq_flag = False
+        return True
+
+    def _response_ready(self):
+        # Non-blocking readiness check: with IRQ this is only a flag/pin read.
+        if self.use_irq:
+            return self._irq_flag or not self._irq.value()
+        return self._wait_ready(1)
+
+    def _irq_responds(self):
+        """Run one command on the IRQ line. If the line is not wired (or on
+        another pin) no edge ever comes, and the driver keeps polling."""
+        self.use_irq = True
+        try:
+            if self.call_function(_COMMAND_GETFIRMWAREVERSION, 4, timeout=100):
+                return True
+        except (RuntimeError, OSError, BusyError):
+            pass
+        if self.debug:
+            print("No response on the IRQ line, polling readiness instead")
+        return False
+
+    def benchmark_ready(self, iterations=20):
+        """Compare round-trip latency of IRQ-driven and polled readiness using
+        GetFirmwareVersion. Returns a dict with the average ms per command for
+        each mode that is available (irq only if the IRQ line responded)."""
+        result = {"irq": self.use_irq}
+        use_irq = self.use_irq
+        modes = (("irq", True), ("poll", False)) if use_irq else (("poll", False),)
+        for name, mode in modes:
+            self.use_irq = mode
+            start = time.ticks_us()
+            for _ in range(iterations):
+                self.call_function(_COMMAND_GETFIRMWAREVERSION, 4, timeout=500)
+            result[name + "_ms"] = time.ticks_diff(time.ticks_us(), start) / iterations / 1000
+        self.use_irq = use_irq
+        if self.debug:
+            print("Ready benchmark:", result)
+        return result
+
     def reset(self):
         """Perform a hardware reset toggle and then wake up the PN532"""
         if self._reset_pin:
@@ -203,65 +306,98 @@ class PN532:
         assert (
             data is not None and 1 < len(data) < 255
         ), "Data must be array of 1 to 255 bytes."
-        # Build frame to send as:
-        # - Preamble (0x00)
-        # - Start code  (0x00, 0xFF)
-        # - Command length (1 byte)
-        # - Command length checksum
-        # - Command bytes
-        # - Checksum
-        # - Postamble (0x00)
         length = len(data)
-        frame = bytearray(length + 8)
-        frame[0] = _PREAMBLE
-        frame[1] = _STARTCODE1
-        frame[2] = _STARTCODE2
-        checksum = sum(frame[0:3])
-        frame[3] = length & 0xFF
-        frame[4] = (~length + 1) & 0xFF
-        frame[5:-2] = data
-        checksum += sum(data)
-        frame[-2] = ~checksum & 0xFF
-        frame[-1] = _POSTAMBLE
-        # Send frame.
+        self._tx_view[5 : 5 + length] = data
+        self._send_frame(length, sum(data))
+
+    def _write_command(self, command, params):
+        """Build the frame for command + params directly in the TX buffer and send it."""
+        length = 2 + len(params)
+        assert 1 < length < 255, "Data must be array of 1 to 255 bytes."
+        if self.autopolling:
+            # Abort the running InAutoPoll the documented way: an ACK frame from the host.
+            self.autopolling = False
+            self._write_data(_ACK)
+        tx = self._tx
+        tx[5] = _HOSTTOPN532
+        tx[6] = command & 0xFF
+        if isinstance(params, (bytes, bytearray, memoryview)):
+            self._tx_view[7 : 5 + length] = params
+            checksum = sum(params)
+        else:
+            checksum = 0
+            for i, val in enumerate(params):
+                tx[7 + i] = val
+                checksum += val
+        self._send_frame(length, _HOSTTOPN532 + (command & 0xFF) + checksum)
+
+    def _send_frame(self, length, data_sum):
+        # Frame layout: preamble, start code (0x00 0xFF), length, length checksum,
+        # data (already in place at offset 5), data checksum, postamble.
+        tx = self._tx
+        tx[0] = _PREAMBLE
+        tx[1] = _STARTCODE1
+        tx[2] = _STARTCODE2
+        tx[3] = length & 0xFF
+        tx[4] = (~length + 1) & 0xFF
+        tx[5 + length] = ~(_STARTCODE2 + data_sum) & 0xFF
+        tx[6 + length] = _POSTAMBLE
+        frame = self._tx_view[: length + 7]
+        self._irq_flag = False
         if self.debug:
             print("Write frame: ", [hex(i) for i in frame])
-        self._write_data(bytes(frame))
+        self._write_data(frame)
 
     def _read_frame(self, length):
         """Read a response frame from the PN532 of at most length bytes in size.
         Returns the data inside the frame if found, otherwise raises an exception
         if there is an error parsing the frame.  Note that less than length bytes
-        might be returned!
+        might be returned! The result is a memoryview into the RX buffer and is
+        only valid until the next command.
         """
         # Read frame with expected length of data.
-        response = self._read_data(length + 7)
+        prefix = self._READ_PREFIX
+        count = self._read_data_into(self._rx_view[: min(length + 7, _FRAME_BUFFER_SIZE) + prefix])
+        response = self._rx
         if self.debug:
-            print("Read frame:", [hex(i) for i in response])
+            print("Read frame:", [hex(i) for i in self._rx_view[prefix:count]])
 
         # Swallow all the 0x00 values that preceed 0xFF.
-        offset = 0
+        offset = prefix
         while response[offset] == 0x00:
             offset += 1
-            if offset >= len(response):
+            if offset >= count:
                 raise RuntimeError("Response frame preamble does not contain 0x00FF!")
         if response[offset] != 0xFF:
             raise RuntimeError("Response frame preamble does not contain 0x00FF!")
         offset += 1
-        if offset >= len(response):
+        if offset >= count:
             raise RuntimeError("Response contains no data!")
         # Check length & length checksum match.
         frame_len = response[offset]
         if (frame_len + response[offset + 1]) & 0xFF != 0:
             raise RuntimeError("Response length checksum did not match length!")
         # Check frame checksum value matches bytes.
-        checksum = sum(response[offset + 2 : offset + 2 + frame_len + 1]) & 0xFF
-        if checksum != 0:
+        start = offset + 2
+        checksum = 0
+        for i in range(start, min(start + frame_len + 1, count)):
+            checksum += response[i]
+        if checksum & 0xFF != 0:
             raise RuntimeError(
-                "Response checksum did not match expected value: ", checksum
+                "Response checksum did not match expected value: ", checksum & 0xFF
             )
         # Return frame data.
-        return response[offset + 2 : offset + 2 + frame_len]
+        return self._rx_view[start : start + frame_len]
+
+    def _read_ack(self):
+        count = self._read_data_into(memoryview(self._ack))
+        prefix = self._READ_PREFIX
+        if count != len(self._ack):
+            return False
+        for i in range(len(_ACK)):
+            if self._ack[prefix + i] != _ACK[i]:
+                return False
+        return True
 
     def call_function(
         self, command, response_length=0, params=[], timeout=1000
@@ -270,27 +406,22 @@ class PN532:
         bytes back in a response.  Note that less than the expected bytes might
         be returned!  Params can optionally specify an array of bytes to send as
         parameters to the function call.  Will wait up to timeout milliseconds
-        for a response and return a bytearray of response bytes, or None if no
-        response is available within the timeout.
+        for a response and return a memoryview of response bytes (only valid
+        until the next command, copy it to keep it), or None if no response is
+        available within the timeout.
         """
         if self.low_power:
             self._wakeup()
 
-        # Build frame data with command and parameters.
-        data = bytearray(2 + len(params))
-        data[0] = _HOSTTOPN532
-        data[1] = command & 0xFF
-        for i, val in enumerate(params):
-            data[2 + i] = val
-        # Send frame and wait for response.
+        # Build the frame in the TX buffer, send it and wait for the ACK.
         try:
-            self._write_frame(data)
+            self._write_command(command, params)
         except OSError:
             return False
-        if not self._wait_ready(timeout):
+        if not self._wait_response(timeout):
             return False
         # Verify ACK response and wait to be ready for function response.
-        if not _ACK == self._read_data(len(_ACK)):
+        if not self._read_ack():
             raise RuntimeError("Did not receive expected ACK from PN532!")
         return self.process_response(
             command, response_length=response_length, timeout=timeout
@@ -306,27 +437,24 @@ class PN532:
         if self.low_power:
             self._wakeup()
 
-        # Build frame data with command and parameters.
-        data = bytearray(2 + len(params))
-        data[0] = _HOSTTOPN532
-        data[1] = command & 0xFF
-        for i, val in enumerate(params):
-            data[2 + i] = val
-        # Send frame and wait for response.
+        # Build the frame in the TX buffer, send it and wait for the ACK.
         try:
-            self._write_frame(data)
+            self._write_command(command, params)
         except OSError:
             return False
-        if not self._wait_ready(timeout):
+        if not self._wait_response(timeout):
             return False
         # Verify ACK response and wait to be ready for function response.
-        if not _ACK == self._read_data(len(_ACK)):
+        if not self._read_ack():
             raise RuntimeError("Did not receive expected ACK from PN532!")
         return True
 
     def process_response(self, command, response_length=0, timeout=1000):
-        if not self._wait_ready(timeout):
+        if not self._wait_response(timeout):
             return None
+        return self._parse_response(command, response_length)
+
+    def _parse_response(self, command, response_length):
         response = self._read_frame(response_length + 2)
         if self.debug:
             print("Volledige response:", [hex(b) for b in response])
@@ -335,6 +463,37 @@ class PN532:
         return response[2:]
 
 
+    # -------------------- uasyncio transport --------------------
+    # Same frames and buffers as call_function, but while the PN532 is busy
+    # (waiting for a card, a reader in target mode, ...) other tasks keep running.
+
+    async def _wait_response_async(self, timeout):
+        start = time.ticks_ms()
+        while not self._response_ready():
+            if time.ticks_diff(time.ticks_ms(), start) >= timeout:
+                return False
+            await asyncio.sleep_ms(2)
+        self._irq_flag = False
+        return True
+
+    async def call_function_async(
+        self, command, response_length=0, params=[], timeout=1000
+    ):  # pylint: disable=dangerous-default-value
+        """Awaitable version of call_function."""
+        if self.low_power:
+            self._wakeup()
+        try:
+            self._write_command(command, params)
+        except OSError:
+            return False
+        if not await self._wait_response_async(timeout):
+            return False
+        if not self._read_ack():
+            raise RuntimeError("Did not receive expected ACK from PN532!")
+        if not await self._wait_response_async(timeout):
+            return None
+        return self._parse_response(command, response_length)
+
     def power_down(self):
         """Put the PN532 into a low power state. If the reset pin is connected a
         hard power down is performed, if not, a soft power down is performed
@@ -361,8 +520,14 @@ class PN532:
         return tuple(response)
 
     def SAM_configuration(self):  # pylint: disable=invalid-name
-        """Configure the PN532 to read MiFare cards."""
+        """Configure the PN532 to read MiFare cards, with finite passive-activation
+        retries so a re-select of a card that left the field ends on the PN532
+        itself instead of only on the host timeout."""
         self.call_function(_COMMAND_SAMCONFIGURATION, params=[0x01, 0x14, 0x01])
+        self.call_function(
+            _COMMAND_RFCONFIGURATION,
+            params=[_CFGITEM_MAX_RETRIES, 0xFF, 0x01, _PASSIVE_ACTIVATION_RETRIES],
+        )
 
     def read_passive_target(self, card_baud=_MIFARE_ISO14443A, timeout=1000):
         """Wait for a MiFare card to be available and return its UID when found.
@@ -392,13 +557,108 @@ class PN532:
         response = self.process_response(
             _COMMAND_INLISTPASSIVETARGET, response_length=30, timeout=timeout
         )
-        if response is None:
+        if response is None or response[0] == 0x00:  # Timeout, or retries used up
             return None
         if response[0] != 0x01:
             raise RuntimeError("More than one card detected!")
         if response[5] > 7:
             raise RuntimeError("Found card with unexpectedly long UID!")
-        return response[6 : 6 + response[5]]
+        self.target_uid = bytes(response[6 : 6 + response[5]])
+        self.target_selected = True
+        return self.target_uid
+
+    def reselect_target(self, uid=None, timeout=100):
+        """Re-select a known card after it dropped out of the ACTIVE state (e.g.
+        after a failed authentication, which halts a MiFare Classic card).
+        InListPassiveTarget is sent with the UID as InitiatorData, so only that
+        card is selected and no anticollision loop or long timeout is needed.
+        Returns True if the card answered.
+        """
+        params = self._reselect_params(uid)
+        if params is None:
+            return False
+        try:
+            response = self.call_function(
+                _COMMAND_INLISTPASSIVETARGET, params=params, response_length=30, timeout=timeout
+            )
+        except (RuntimeError, BusyError, OSError) as e:
+            if self.debug:
+                print("Re-select failed:", e)
+            return False
+        return self._reselected(uid, response)
+
+    async def reselect_target_async(self, uid=None, timeout=100):
+        """Awaitable reselect_target, e.g. to check whether a card is still present."""
+        params = self._reselect_params(uid)
+        if params is None:
+            return False
+        try:
+            response = await self.call_function_async(
+                _COMMAND_INLISTPASSIVETARGET, params=params, response_length=30, timeout=timeout
+            )
+        except (RuntimeError, BusyError, OSError) as e:
+            if self.debug:
+                print("Re-select failed:", e)
+            return False
+        return self._reselected(uid, response)
+
+    def _reselect_params(self, uid):
+        if uid is None:
+            uid = self.target_uid
+        self.target_selected = False
+        if uid is None:
+            return None
+        params = bytearray(2 + len(uid))
+        params[0] = 0x01
+        params[1] = _MIFARE_ISO14443A
+        params[2:] = uid
+        return params
+
+    def _reselected(self, uid, response):
+        if not response or response[0] != 0x01:
+            return False
+        if uid is not None:
+            self.target_uid = bytes(uid)
+        self.target_selected = True
+        return True
+
+    def start_autopoll(self, period=1, card_types=(_AUTOPOLL_MIFARE_106A,)):
+        """Let the PN532 poll for cards by itself (InAutoPoll) until one is found.
+        period is in units of 150 ms. Only the ACK is awaited: the result comes
+        as a response frame (and IRQ edge) once a card enters the field, so the
+        host does nothing while no card is present. The next command first aborts
+        the autopoll with an ACK frame (see _write_command). Returns True if the
+        command was acknowledged.
+        """
+        params = bytearray(2 + len(card_types))
+        params[0] = 0xFF  # poll endlessly
+        params[1] = period
+        params[2:] = bytes(card_types)
+        try:
+            started = self.send_command(_COMMAND_INAUTOPOLL, params=params, timeout=100)
+        except (RuntimeError, BusyError):
+            started = False
+        self.autopolling = bool(started)
+        return self.autopolling
+
+    def read_autopoll(self):
+        """Non-blocking check for an InAutoPoll result. Returns (uid, atqa, sak)
+        of the card that was found and selected, or None if nothing is there yet.
+        """
+        if not self.autopolling or not self._response_ready():
+            return None
+        self.autopolling = False
+        response = self.process_response(_COMMAND_INAUTOPOLL, response_length=32, timeout=1)
+        # NbTg, Type, Length, then the InListPassiveTarget target data:
+        # Tg, SENS_RES (2), SEL_RES, NFCIDLength, NFCID1
+        if not response or response[0] < 1 or len(response) < 8:
+            return None
+        uid_len = response[7]
+        if uid_len > 7:
+            raise RuntimeError("Found card with unexpectedly long UID!")
+        self.target_uid = bytes(response[8 : 8 + uid_len])
+        self.target_selected = True
+        return self.target_uid, bytes(response[4:6]), response[6]
 
     def mifare_classic_authenticate_block(
         self, uid, block_number, key_number, key
@@ -416,19 +676,45 @@ class PN532:
         response = self.call_function(
             _COMMAND_INDATAEXCHANGE, params=params, response_length=1
         )
-        return response[0] == 0x00
+        if response and response[0] == 0x00:
+            self.target_selected = True
+            return True
+        # A failed authentication halts the card: every following command would
+        # run into the PN532 timeout, so re-select it right away.
+        self.reselect_target(uid)
+        return False
 
     def mifare_classic_read_block(self, block_number):
         """Read a block of data from the card.
         """
+        response = self._read_block(block_number)
+        if response is None:
+            return None
+        return bytes(response)
+
+    def mifare_classic_read_block_into(self, block_number, buf):
+        """Read a block of data straight into buf (16 bytes, e.g. a memoryview
+        into a card image) without allocating. Returns True on success.
+        """
+        response = self._read_block(block_number)
+        if response is None:
+            return False
+        buf[:16] = response
+        return True
+
+    def _read_block(self, block_number):
+        params = self._block_params
+        params[0] = 0x01
+        params[1] = MIFARE_CMD_READ
+        params[2] = block_number & 0xFF
         response = self.call_function(
-            _COMMAND_INDATAEXCHANGE,
-            params=[0x01, MIFARE_CMD_READ, block_number & 0xFF],
-            response_length=17,
+            _COMMAND_INDATAEXCHANGE, params=params, response_length=17
         )
-        if response[0] != 0x00:
+        if not response or response[0] != 0x00:
+            # Read refused (access bits) or no answer: the card is halted now.
+            self.target_selected = False
             return None
-        return response[1:]
+        return response[1:17]
 
     def mifare_classic_write_block(self, block_number, data):
         """Write a block of data to the card.
@@ -510,6 +796,41 @@ class PN532:
             print("tginitastarget error:", e)
             return None
 
+    async def tginitastarget_async(self, params, timeout=1000):
+        """Awaitable tginitastarget: waiting for a reader does not block other tasks."""
+        try:
+            return await self.call_function_async(
+                _COMMAND_TGINITASTARGET, params=params, response_length=1, timeout=timeout
+            )
+        except Exception as e:
+            print("tginitastarget error:", e)
+            return None
+
+    def tggetdata(self, timeout=500):
+        """Haal data op die de initiator naar ons (als target) gestuurd heeft.
+        Retourneert de bytes zonder statusbyte, of None bij geen data/fout."""
+        try:
+            response = self.call_function(_COMMAND_TGGETDATA, response_length=64, timeout=timeout)
+        except RuntimeError as e:
+            print("tggetdata error:", e)
+            return None
+        if not response or response[0] != 0x00:
+            return None
+        return bytes(response[1:])
+
+    async def tggetdata_async(self, timeout=500):
+        """Awaitable tggetdata."""
+        try:
+            response = await self.call_function_async(
+                _COMMAND_TGGETDATA, response_length=64, timeout=timeout
+            )
+        except RuntimeError as e:
+            print("tggetdata error:", e)
+            return None
+        if not response or response[0] != 0x00:
+            return None
+        return bytes(response[1:])
+
 
     def read_data_as_target(self, buffer):
         """
@@ -521,6 +842,5 @@ class PN532:
         response = self.call_function(_COMMAND_TGGETDATA, response_length=len(buffer))
         if response is None:
             return -1
-        for i in range(len(response)):
-            buffer[i] = response[i]
+        buffer[: len(response)] = response
         return len(response)
@@ -0,0 +1,94 @@
+"""
+Ringbuffer van vaste grootte voor binnenkomende UART-data.
+
+De buffer wordt één keer gealloceerd; data wordt er met readinto direct in
+gelezen en de parser kijkt er via offsets en memoryviews in, zonder kopieën.
+"""
+
+
+class RingBuffer:
+    __slots__ = ("_buf", "_mv", "_size", "_head", "_count")
+
+    def __init__(self, size=1024):
+        self._buf = bytearray(size)
+        self._mv = memoryview(self._buf)
+        self._size = size
+        self._head = 0   # Positie van de eerste ongelezen byte
+        self._count = 0  # Aantal ongelezen bytes
+
+    def __len__(self):
+        return self._count
+
+    def free(self):
+        return self._size - self._count
+
+    def fill_from(self, stream, limit=None):
+        """Lees zoveel mogelijk uit stream (UART) in de vrije ruimte. Retourneert het aantal bytes."""
+        total = 0
+        while self._count < self._size:
+            tail = (self._head + self._count) % self._size
+            end = self._size if tail >= self._head else self._head
+            if limit is not None:
+                end = min(end, tail + limit - total)
+            if end <= tail:
+                break
+            n = stream.readinto(self._mv[tail:end])
+            if not n:
+                break
+            self._count += n
+            total += n
+            if n < end - tail:
+                break
+        return total
+
+    def __getitem__(self, i):
+        return self._buf[(self._head + i) % self._size]
+
+    def find(self, byte, start=0, end=None):
+        """
+        Offset van de eerste byte-waarde vanaf start, of -1. Een gewone indexlus:
+        MicroPython's bytearray heeft geen find, en zo wordt er niets gealloceerd.
+        """
+        if end is None or end > self._count:
+            end = self._count
+        buf, size = self._buf, self._size
+        pos = (self._head + start) % size
+        i = start
+        while i < end:
+            if buf[pos] == byte:
+                return i
+            i += 1
+            pos += 1
+            if pos == size:
+                pos = 0
+        return -1
+
+    def startswith(self, prefix):
+        if self._count < len(prefix):
+            return False
+        for i in range(len(prefix)):
+            if self[i] != prefix[i]:
+                return False
+        return True
+
+    def segments(self, n):
+        """Eén of twee memoryviews over de eerste n bytes (zonder kopie)."""
+        head = self._head
+        first = min(n, self._size - head)
+        if first == n:
+            return (self._mv[head:head + n],)
+        return (self._mv[head:head + first], self._mv[0:n - first])
+
+    def read(self, n):
+        """Kopieer en verwijder de eerste n bytes."""
+        n = min(n, self._count)
+        data = b"".join(bytes(seg) for seg in self.segments(n))
+        self.consume(n)
+        return data
+
+    def consume(self, n):
+        n = min(n, self._count)
+        self._head = (self._head + n) % self._size
+        self._count -= n
+        if not self._count:
+            self._head = 0
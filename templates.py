@@ -0,0 +1,73 @@
+"""
+Gecachte HTML-templates voor de webserver.
+
+Een template wordt één keer van flash gelezen en bij de {{NAAM}}-placeholders
+opgesplitst in vooraf gecodeerde byte-segmenten. Per request worden alleen de
+ingevulde waarden gecodeerd; Content-Length en ETag volgen uit de segmenten.
+"""
+
+import binascii
+
+_cache = {}
+
+# Vaste headerregels, één keer gecodeerd
+_HTML_200 = b"HTTP/1.1 200 OK\r\nContent-Type: text/html; charset=utf-8\r\nCache-Control: no-cache\r\n"
+_NOT_MODIFIED = b"HTTP/1.1 304 Not Modified\r\n"
+CONNECTION_CLOSE = b"Connection: close\r\n\r\n"
+CONNECTION_KEEP_ALIVE = b"Connection: keep-alive\r\nKeep-Alive: timeout=5\r\n\r\n"
+
+
+class Template:
+    __slots__ = ("parts", "static_len", "crc")
+
+    def __init__(self, filename):
+        with open(filename, "rb") as f:
+            data = f.read()
+        self.parts = []  # bytes = vaste tekst, str = naam van een placeholder
+        pos = 0
+        while True:
+            start = data.find(b"{{", pos)
+            end = data.find(b"}}", start + 2) if start >= 0 else -1
+            if end < 0:
+                self.parts.append(data[pos:])
+                break
+            self.parts.append(data[pos:start])
+            self.parts.append(data[start + 2:end].decode())
+            pos = end + 2
+        self.static_len = sum(len(p) for p in self.parts if isinstance(p, bytes))
+        self.crc = binascii.crc32(data)
+
+    def render(self, **values):
+        """
+        Vul de placeholders in. Retourneert (segmenten, lengte, etag); de segmenten
+        kunnen zonder samenvoegen naar WiFiChip.respond.
+        """
+        out = []
+        length = self.static_len
+        crc = self.crc
+        for part in self.parts:
+            if isinstance(part, str):
+                part = values.get(part, b"")
+                if not isinstance(part, bytes):
+                    part = str(part).encode()
+                length += len(part)
+                crc = binascii.crc32(part, crc)
+            if part:
+                out.append(part)
+        return out, length, '"{:08x}"'.format(crc & 0xFFFFFFFF)
+
+
+def get(filename):
+    """Template uit de cache; wordt bij het eerste gebruik van flash geladen."""
+    template = _cache.get(filename)
+    if template is None:
+        template = _cache[filename] = Template(filename)
+    return template
+
+
+def html_header(length, etag, connection=CONNECTION_CLOSE):
+    return b"".join((_HTML_200, "Content-Length: {}\r\nETag: {}\r\n".format(length, etag).encode(), connection))
+
+
+def not_modified(etag, connection=CONNECTION_CLOSE):
+    return b"".join((_NOT_MODIFIED, "ETag: {}\r\n".format(etag).encode(), connection))
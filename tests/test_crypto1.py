@@ -0,0 +1,40 @@
+"""
+Bekende testvectoren voor crypto1 (draait op CPython: python -m pytest tests).
+
+De vectoren komen uit de voorbeelden bij mfkey32v2 en mfkey64 van crapto1.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import crypto1  # noqa: E402
+
+
+def test_mfkey32():
+    key = crypto1.mfkey32(0x12345678, 0x1AD8DF2B, 0x1D316024, 0x620EF048,
+                          0x30D6CB07, 0xC52077E2, 0x837AC61A)
+    assert key == 0xA0A1A2A3A4A5
+
+
+def test_mfkey64():
+    key = crypto1.mfkey64(0x9C599B32, 0x82A4166C, 0xA1E458CE, 0x6EEA41E0, 0x5CADF439)
+    assert key == 0xFFFFFFFFFFFF
+
+
+def test_lfsr_recovery64():
+    state = crypto1.Crypto1(0xA0A1A2A3A4A5)
+    state.word(0x12345678)
+    state.word(0x0BADF00D)
+    odd, even = state.odd, state.even
+    ks2 = state.word()
+    ks3 = state.word()
+    assert list(crypto1.lfsr_recovery64(ks2, ks3)) == [(odd, even)]
+
+
+def test_rounds_for():
+    assert crypto1._rounds_for(None) == 1  # CPython: geen gc.mem_free
+    assert crypto1._rounds_for(crypto1._HALF_SIZE) == 1
+    assert crypto1._rounds_for(12000) == 64
+    assert crypto1._rounds_for(1) == 256
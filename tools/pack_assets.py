@@ -0,0 +1,75 @@
+"""
+Maak .gz-versies van de statische webbestanden voor op de Hackbat (draait op de pc).
+
+WiFiChip.serve_file stuurt het .gz-bestand met Content-Encoding: gzip als de browser
+dat accepteert. Alles gaat op 115200 baud over de UART naar de ESP8266, dus elke
+bespaarde byte scheelt direct in de laadtijd.
+
+Gebruik:
+    python tools/pack_assets.py [map of bestanden...] [--baud 115200]
+"""
+
+import argparse
+import gzip
+import os
+import sys
+
+EXTENSIONS = (".js", ".css", ".html")
+
+
+def find_assets(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                full = os.path.join(path, name)
+                if os.path.isfile(full) and name.endswith(EXTENSIONS):
+                    yield full
+        else:
+            yield path
+
+
+def pack(filename):
+    """Schrijf filename.gz en retourneer (originele grootte, gzip-grootte), of None voor templates."""
+    with open(filename, "rb") as f:
+        data = f.read()
+    if b"{{" in data:
+        return None  # Template: wordt op de Hackbat ingevuld, niet als bestand verstuurd
+    packed = gzip.compress(data, compresslevel=9, mtime=0)  # mtime=0: reproduceerbaar
+    with open(filename + ".gz", "wb") as f:
+        f.write(packed)
+    return len(data), len(packed)
+
+
+def transfer_ms(size, baud):
+    # 8N1: 10 bits per byte over de UART
+    return size * 10 * 1000 // baud
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("paths", nargs="*", default=["."])
+    parser.add_argument("--baud", type=int, default=115200)
+    args = parser.parse_args(argv)
+
+    total_raw = total_gz = 0
+    print("{:<30} {:>9} {:>9} {:>6} {:>10}".format("bestand", "origineel", "gzip", "%", "bespaard"))
+    for filename in find_assets(args.paths):
+        sizes = pack(filename)
+        if sizes is None:
+            print("{:<30} overgeslagen (template)".format(filename))
+            continue
+        raw, packed = sizes
+        total_raw += raw
+        total_gz += packed
+        saved = transfer_ms(raw, args.baud) - transfer_ms(packed, args.baud)
+        print("{:<30} {:>9} {:>9} {:>5}% {:>8} ms".format(
+            filename, raw, packed, packed * 100 // raw if raw else 100, saved))
+    if total_raw:
+        print("{:<30} {:>9} {:>9} {:>5}% {:>8} ms  (UART op {} baud)".format(
+            "totaal", total_raw, total_gz, total_gz * 100 // total_raw,
+            transfer_ms(total_raw, args.baud) - transfer_ms(total_gz, args.baud), args.baud))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,58 +1,534 @@
 import time
-import micropython
+import uasyncio as asyncio
 from machine import UART, Pin
 from display import Display, debug_print
+from ringbuf import RingBuffer
+import templates
+import dumpexport
 
 import os
 
+# Afsluitende regels van een AT-commando
+_OK = (b"OK",)
+_SEND_OK = (b"SEND OK",)
+_PROMPT = (b">",)
+_ERRORS = (b"ERROR", b"FAIL", b"SEND FAIL", b"link is not valid")
+
+BAUDRATE = 115200                # Standaardsnelheid van de ESP8266 na een reset
+FAST_BAUDRATES = (921600, 460800)  # Geprobeerd met AT+UART_CUR, snelste eerst
+UART_RXBUF = 2048                # Bij 921600 baud komt er ~460 bytes binnen per 5 ms pauze
+
+AT_TIMEOUT_MS = 1000     # Standaard timeout per commando
+SETUP_TIMEOUT_MS = 5000  # CWMODE/CWSAP/CIPSERVER kunnen seconden duren
+CIPSEND_MAX = 2048       # Maximale payload per AT+CIPSEND
+RX_BUFFER_SIZE = 1024    # Ringbuffer voor UART-data; +IPD-payload wordt er doorheen gestroomd
+SEND_CHUNK = 1024        # Bytes per beurt per verbinding in de response-scheduler
+KEEPALIVE_IDLE_MS = 5000 # Inactieve keep-alive verbindingen worden hierna gesloten
+MAX_KEEPALIVE_LINKS = 3  # De ESP8266 heeft 5 links; houd er een paar vrij voor nieuwe clients
+LONGPOLL_MAX_MS = 20000  # Langste wachttijd van een /events-request
+
+_CLOSE = object()        # Markering in de uitgaande wachtrij: verbinding hierna sluiten
+
+# Toestanden van de request-parser per verbinding
+_REQUEST_LINE = 0
+_HEADERS = 1
+_BODY = 2
+
+_MAX_LINE = 512
+_MAX_HEADERS = 24
+
+
+class HttpLink:
+    """
+    Request-parser voor één ESP8266-verbinding (link ID). De +IPD-payload komt
+    in willekeurige stukken binnen; complete requests gaan naar de wachtrij als
+    (link_id, method, path, headers, body). Meerdere requests na elkaar
+    (pipelining) worden één voor één herkend.
+    """
+    __slots__ = ("link_id", "state", "line", "method", "path", "version", "headers", "remaining", "body",
+                 "keep_alive", "last_active")
+
+    def __init__(self, link_id):
+        self.link_id = link_id
+        self.keep_alive = False  # Besloten per request in WiFiChip.process_request
+        self.last_active = time.ticks_ms()
+        self.reset()
+
+    def reset(self):
+        self.state = _REQUEST_LINE
+        self.line = bytearray()
+        self.method = None
+        self.path = None
+        self.version = None
+        self.headers = {}
+        self.remaining = 0
+        self.body = None
+
+    def feed(self, ring, n, out):
+        """Verwerk de eerste n bytes uit de ringbuffer."""
+        while n:
+            if self.state == _BODY:
+                take = min(self.remaining, n)
+                for seg in ring.segments(take):
+                    self.body.extend(seg)
+                ring.consume(take)
+                n -= take
+                self.remaining -= take
+                if not self.remaining:
+                    self._complete(out)
+                continue
+            end = ring.find(0x0A, 0, n)
+            take = n if end < 0 else end + 1
+            if len(self.line) + take <= _MAX_LINE:  # Te lange regels worden afgekapt
+                for seg in ring.segments(take):
+                    self.line.extend(seg)
+            ring.consume(take)
+            n -= take
+            if end >= 0:
+                self._on_line(out)
+
+    def _on_line(self, out):
+        line = bytes(self.line).decode("utf-8", "ignore").rstrip("\r\n")
+        self.line = bytearray()
+        if self.state == _REQUEST_LINE:
+            if not line:
+                return  # Lege regels tussen requests
+            parts = line.split()
+            if len(parts) < 2:
+                debug_print("Request line incomplete: " + line)
+                return
+            self.method, self.path = parts[0], parts[1]
+            self.version = parts[2] if len(parts) > 2 else "HTTP/1.0"
+            self.state = _HEADERS
+            return
+        if line:
+            if len(self.headers) < _MAX_HEADERS:
+                name, _, value = line.partition(":")
+                self.headers[name.strip().lower()] = value.strip()
+            return
+        # Lege regel: einde van de headers
+        try:
+            length = int(self.headers.get("content-length", "0"))
+        except ValueError:
+            length = 0
+        if length > 0:
+            self.state = _BODY
+            self.remaining = length
+            self.body = bytearray()
+        else:
+            self._complete(out)
+
+    def _complete(self, out):
+        # HTTP/1.1 is standaard persistent, HTTP/1.0 alleen op verzoek
+        connection = self.headers.get("connection", "").lower()
+        if self.version == "HTTP/1.1":
+            keep_alive = "close" not in connection
+        else:
+            keep_alive = "keep-alive" in connection
+        out.append((self.link_id, self.method, self.path, self.headers, self.body, keep_alive))
+        self.reset()
 
 
 class WiFiChip:
-    def __init__(self, web_delay=300):
-        self.WEB_DELAY = web_delay
-        self.uart = UART(0, baudrate=115200, tx=Pin(0), rx=Pin(1))
-        self.uart_busy = False
-        self.uart_proc_scheduled = False
+    def __init__(self, timeout_ms=AT_TIMEOUT_MS):
+        self.timeout_ms = timeout_ms
+        self.baudrate = BAUDRATE
+        self.uart = UART(0, baudrate=BAUDRATE, tx=Pin(0), rx=Pin(1), rxbuf=UART_RXBUF)
+        self.rx_bytes = 0        # Statistiek: ontvangen bytes
+        self.tx_payload = 0      # Statistiek: verstuurde HTTP-payload
+        self.tx_ms = 0           # ...en de tijd die dat kostte
         self.ap_ip = "unknown"
         self.nfc = None  # Wordt later ingesteld vanuit main.py
-        self.http_buffer = b""
+        self.jobs = None  # JobScheduler, idem
+        # AT-engine: ontvangen bytes en het lopende commando
+        self._rx = RingBuffer(RX_BUFFER_SIZE)
+        self._cmd_lock = asyncio.Lock()  # Eén AT-commando tegelijk
+        self._expect = None   # Tuple met de verwachte eindregels, None = geen commando actief
+        self._result = None   # None = nog bezig, True = gelukt, False = fout
+        self._lines = []      # Antwoordregels van het lopende commando
+        # +IPD-demultiplexer
+        self._links = {}      # link_id -> HttpLink
+        self._ipd_link = None # Verbinding waarvan de payload nu binnenstroomt
+        self._ipd_left = 0    # Nog te ontvangen payload-bytes van dat +IPD-frame
+        self._requests = []   # Complete requests, af te handelen door serve()
+        self._busy = set()    # Verbindingen waarvan een request nog in behandeling is
+        # Response-scheduler: per verbinding een wachtrij met bytes en open bestanden
+        self._out = {}        # link_id -> [onderdelen..., _CLOSE]
+        self._order = []      # Round-robin volgorde van verbindingen met uitgaande data
+        self._out_ready = asyncio.Event()
+        self._tx = bytearray(SEND_CHUNK)
+        self._tx_view = memoryview(self._tx)
 
     def set_nfc(self, nfc_instance):
         self.nfc = nfc_instance
 
-    def send_command(self, cmd, delay_ms=None):
-        if delay_ms is None:
-            delay_ms = self.WEB_DELAY
+    def set_jobs(self, scheduler):
+        self.jobs = scheduler
+
+    # -------------------- AT-engine --------------------
+    # Alle UART-data loopt door _pump: antwoorden gaan naar het lopende commando,
+    # +IPD-payload naar de parser van de juiste verbinding, ook als die tussen de
+    # regels van een antwoord binnenkomt.
+
+    def _pump(self):
+        while True:
+            n = self.uart.any()
+            if not n:
+                break
+            n = self._rx.fill_from(self.uart, n)
+            if not n:
+                break
+            self.rx_bytes += n
+            self._parse()
+
+    def _link(self, link_id):
+        link = self._links.get(link_id)
+        if link is None:
+            link = self._links[link_id] = HttpLink(link_id)
+        return link
+
+    def _parse(self):
+        rx = self._rx
+        while len(rx):
+            if self._ipd_left:
+                n = min(len(rx), self._ipd_left)
+                self._ipd_left -= n
+                self._ipd_link.feed(rx, n, self._requests)
+                continue
+            first = rx[0]
+            # Ook spaties aan het begin van een regel: de CIPSEND-prompt is "> ", en de
+            # spatie kan los na de '>' binnenkomen (vóór een +IPD of CONNECT-melding)
+            if first == 0x0D or first == 0x0A or first == 0x20:
+                rx.consume(1)
+                continue
+            if rx.startswith(b"+IPD,"):
+                colon = rx.find(0x3A, 0, 32)  # ':'
+                if colon < 0 and len(rx) < 32:
+                    break  # Header nog niet compleet
+                if colon >= 0:
+                    self._start_ipd(rx.read(colon + 1))
+                    continue
+            if first == 0x3E and self._expect is _PROMPT:  # '>' van AT+CIPSEND
+                rx.consume(1)
+                self._finish(True)
+                continue
+            end = rx.find(0x0A)
+            if end < 0:
+                if not rx.free():  # Regel past niet in de buffer: weggooien
+                    rx.consume(len(rx))
+                break
+            self._on_line(rx.read(end + 1).rstrip(b"\r\n"))
+
+    def _start_ipd(self, header):
+        """+IPD,<id>,<len>[,<ip>,<port>]: — de payload volgt in _parse."""
+        fields = header[5:-1].split(b",")
         try:
+            link_id, length = fields[0].decode(), int(fields[1])
+        except (IndexError, ValueError):
+            debug_print("Ongeldige +IPD header")
+            return
+        self._ipd_link = self._link(link_id)
+        self._ipd_link.last_active = time.ticks_ms()
+        self._ipd_left = length
+
+    def _on_line(self, line):
+        # Verbindingsmeldingen ("0,CONNECT", "0,CLOSED") kunnen ook midden in een antwoord komen
+        if line.endswith(b",CONNECT"):
+            self._links[line[:-8].decode()] = HttpLink(line[:-8].decode())
+            return
+        if line.endswith(b",CLOSED") or line.endswith(b",CONNECT FAIL"):
+            link_id = line.split(b",")[0].decode()
+            self._links.pop(link_id, None)
+            self._drop_output(link_id)
+            return
+        if self._expect is not None and self._result is None:
+            if line in self._expect:
+                self._finish(True)
+                return
+            if line in _ERRORS:
+                self._finish(False)
+                return
+            self._lines.append(line)
+        else:
+            debug_print("ESP: " + line.decode("utf-8", "ignore"))
+
+    def _finish(self, ok):
+        self._result = ok
+
+    async def _wait(self, timeout_ms):
+        start = time.ticks_ms()
+        while True:
+            self._pump()
+            if self._result is not None:
+                return self._result
+            if time.ticks_diff(time.ticks_ms(), start) >= timeout_ms:
+                return None
+            await asyncio.sleep_ms(1)
+
+    async def _transact(self, data, expect, timeout_ms):
+        """Schrijf data en wacht op een eindregel uit expect (of een fout)."""
+        self._expect = expect
+        self._result = None
+        self._lines = []
+        self.uart.write(data)
+        result = await self._wait(timeout_ms)
+        self._expect = None
+        return result
+
+    async def command(self, cmd, timeout_ms=None, expect=_OK):
+        """
+        Voer een AT-commando uit en wacht tot de ESP8266 OK of ERROR antwoordt.
+        Retourneert de antwoordregels als tekst, of None bij een fout of timeout.
+        """
+        if timeout_ms is None:
+            timeout_ms = self.timeout_ms
+        async with self._cmd_lock:
             debug_print("Sending command: " + cmd)
-            self.uart.write((cmd + "\r\n").encode())
-            time.sleep_ms(delay_ms)
-            response = self.uart.read()
-            if response:
-                try:
-                    decoded = response.decode().strip()
-                    debug_print("Received response: " + decoded)
-                    return decoded
-                except Exception as e:
-                    debug_print("Error decoding response: " + str(e))
-                    return response
+            result = await self._transact((cmd + "\r\n").encode(), expect, timeout_ms)
+            response = b"\n".join(self._lines).decode("utf-8", "ignore")
+        if result is None:
+            debug_print("Timeout na {} ms op: {}".format(timeout_ms, cmd))
+            return None
+        if not result:
+            debug_print("Fout op {}: {}".format(cmd, response))
+            return None
+        return response
+
+    async def send_data(self, link_id, data, timeout_ms=None):
+        """Verstuur data over een verbinding (in stukken van maximaal CIPSEND_MAX bytes)."""
+        if timeout_ms is None:
+            timeout_ms = self.timeout_ms
+        view = memoryview(data)
+        started = time.ticks_ms()
+        for start in range(0, len(data), CIPSEND_MAX):
+            chunk = view[start:start + CIPSEND_MAX]
+            async with self._cmd_lock:
+                cmd = "AT+CIPSEND={},{}\r\n".format(link_id, len(chunk)).encode()
+                if not await self._transact(cmd, _PROMPT, timeout_ms):
+                    debug_print("Geen CIPSEND-prompt voor link " + str(link_id))
+                    return False
+                if not await self._transact(chunk, _SEND_OK, timeout_ms + len(chunk) * 10000 // self.baudrate):
+                    debug_print("SEND OK ontbreekt voor link " + str(link_id))
+                    return False
+        self.tx_payload += len(data)
+        self.tx_ms += time.ticks_diff(time.ticks_ms(), started)
+        return True
+
+    async def close_link(self, link_id):
+        return await self.command("AT+CIPCLOSE={}".format(link_id)) is not None
+
+    # -------------------- Response-scheduler --------------------
+    # Handlers zetten hun antwoord (bytes en/of open bestanden) in de wachtrij van
+    # hun verbinding. De sender-taak verstuurt om de beurt één chunk per verbinding,
+    # zodat een kleine pagina niet hoeft te wachten tot een grote download klaar is.
+
+    def respond(self, link_id, *parts, close=None):
+        """
+        Zet een antwoord in de wachtrij; bestanden worden gestreamd en daarna gesloten.
+        Zonder close volgt de verbinding de keep-alive beslissing van het request.
+        """
+        if close is None:
+            link = self._links.get(link_id)
+            close = link is None or not link.keep_alive
+        queue = self._out.get(link_id)
+        if queue is None:
+            queue = self._out[link_id] = []
+        queue.extend(parts)
+        if close:
+            queue.append(_CLOSE)
+        if link_id not in self._order:
+            self._order.append(link_id)
+        self._out_ready.set()
+
+    def _connection(self, link_id):
+        """Connection-header (met afsluitende lege regel) voor het antwoord op deze verbinding."""
+        link = self._links.get(link_id)
+        if link is not None and link.keep_alive:
+            return templates.CONNECTION_KEEP_ALIVE
+        return templates.CONNECTION_CLOSE
+
+    def _reap_idle(self):
+        """Sluit keep-alive verbindingen die te lang niets gedaan hebben."""
+        now = time.ticks_ms()
+        for link_id, link in self._links.items():
+            if (link.keep_alive and link_id not in self._busy and link_id not in self._out
+                    and time.ticks_diff(now, link.last_active) > KEEPALIVE_IDLE_MS):
+                link.keep_alive = False
+                self.respond(link_id, close=True)
+
+    def _drop_output(self, link_id):
+        for part in self._out.pop(link_id, ()):
+            if hasattr(part, "readinto"):
+                part.close()
+        if link_id in self._order:
+            self._order.remove(link_id)
+
+    def _next_chunk(self, queue):
+        """Vul de zendbuffer met maximaal SEND_CHUNK bytes uit de kop van de wachtrij."""
+        n = 0
+        while queue and n < SEND_CHUNK and queue[0] is not _CLOSE:
+            part = queue[0]
+            if hasattr(part, "readinto"):
+                got = part.readinto(self._tx_view[n:])
+                if not got:
+                    part.close()
+                    queue.pop(0)
+                    continue
+                n += got
+                continue
+            take = min(len(part), SEND_CHUNK - n)
+            self._tx_view[n:n + take] = part[:take]
+            n += take
+            if take < len(part):
+                queue[0] = memoryview(part)[take:]
             else:
-                debug_print("No response received for command: " + cmd)
-        except Exception as e:
-            debug_print("send_command exception: " + str(e))
-        return ""
-
-    def setup(self):
-        self.send_command("AT", self.WEB_DELAY)
-        self.send_command("AT+CWMODE=2", self.WEB_DELAY)
-        self.send_command('AT+CWSAP="Hackbat_AP","hackbat123",5,3', self.WEB_DELAY)
-        self.send_command("AT+CIPMUX=1", self.WEB_DELAY)
-        self.send_command("AT+CIPSERVER=1,80", self.WEB_DELAY)
+                queue.pop(0)
+        return self._tx_view[:n]
+
+    async def _sender(self):
+        while True:
+            if not self._order:
+                self._out_ready.clear()
+                await self._out_ready.wait()
+                continue
+            link_id = self._order.pop(0)
+            queue = self._out.get(link_id)
+            if not queue:
+                self._out.pop(link_id, None)
+                continue
+            if queue[0] is _CLOSE:
+                queue.pop(0)
+                await self.close_link(link_id)
+                self._links.pop(link_id, None)
+            else:
+                chunk = self._next_chunk(queue)
+                if len(chunk) and not await self.send_data(link_id, chunk):
+                    self._drop_output(link_id)
+                    continue
+                link = self._links.get(link_id)
+                if link is not None:
+                    link.last_active = time.ticks_ms()
+            if queue and self._out.get(link_id) is queue:
+                self._order.append(link_id)  # Achteraan: de volgende verbinding is aan de beurt
+            elif not queue:
+                self._out.pop(link_id, None)
+            await asyncio.sleep_ms(0)  # Nieuwe requests kunnen zich tussen twee chunks aanmelden
+
+    async def _handle(self, request):
+        try:
+            await self.process_request(*request)
+        finally:
+            self._busy.discard(request[0])
+
+    def _next_request(self):
+        """Eerste request waarvan de verbinding niet al met een eerder request bezig is."""
+        for i, request in enumerate(self._requests):
+            if request[0] not in self._busy:
+                self._busy.add(request[0])
+                return self._requests.pop(i)
+        return None
+
+    async def serve(self, idle_ms=5):
+        """Webserver-taak: pomp de UART en start een handler per ontvangen request."""
+        asyncio.create_task(self._sender())
+        last_reap = time.ticks_ms()
+        while True:
+            self._pump()
+            if time.ticks_diff(time.ticks_ms(), last_reap) >= 1000:
+                last_reap = time.ticks_ms()
+                self._reap_idle()
+            request = self._next_request()
+            if request is not None:
+                asyncio.create_task(self._handle(request))
+            else:
+                await asyncio.sleep_ms(idle_ms)
+
+    # -------------------- UART-snelheid --------------------
+
+    def _set_local_baud(self, baud):
+        self.uart.init(baudrate=baud, tx=Pin(0), rx=Pin(1), rxbuf=UART_RXBUF)
+        self.baudrate = baud
+        # Half ontvangen regels van de oude snelheid zijn onbruikbaar
+        self._rx.consume(len(self._rx))
+
+    async def _link_ok(self):
+        """Controleer de verbinding: een paar AT-rondes en een langer antwoord (AT+GMR)."""
+        for _ in range(3):
+            if await self.command("AT", 200) is None:
+                return False
+        return await self.command("AT+GMR", 500) is not None
+
+    async def negotiate_baud(self, rates=FAST_BAUDRATES):
+        """
+        Zet de UART naar de ESP8266 op de hoogste snelheid die foutloos werkt.
+        AT+UART_CUR wordt niet in flash bewaard, dus na een reset van de ESP begint
+        die weer op BAUDRATE. Valt een snelheid tegen, dan terug naar BAUDRATE.
+        Retourneert de snelheid waarop de ESP antwoordt, of None als hij zoek is.
+        """
+        for baud in rates:
+            if await self.command("AT+UART_CUR={},8,1,0,0".format(baud)) is None:
+                continue
+            await asyncio.sleep_ms(20)  # De ESP schakelt pas om na zijn OK
+            self._set_local_baud(baud)
+            if await self._link_ok():
+                debug_print("UART naar ESP8266 op {} baud".format(baud))
+                return baud
+            debug_print("{} baud onbetrouwbaar, terug naar {}".format(baud, BAUDRATE))
+            # De ESP staat (waarschijnlijk) op de nieuwe snelheid: blind terugzetten
+            self.uart.write("AT+UART_CUR={},8,1,0,0\r\n".format(BAUDRATE).encode())
+            await asyncio.sleep_ms(50)
+            self._set_local_baud(BAUDRATE)
+            if not await self._link_ok():
+                # Terugzetten mislukt: opnieuw zoeken waar de ESP nu staat, anders
+                # lopen alle volgende AT-commando's op een andere snelheid
+                baud = await self._find_baud()
+                debug_print("ESP8266 teruggevonden op {} baud".format(baud))
+                return baud
+        return self.baudrate
+
+    async def _find_baud(self):
+        """Zoek de snelheid waarop de ESP8266 nog staat (bijvoorbeeld na een soft reset van de Pico)."""
+        for baud in (BAUDRATE,) + FAST_BAUDRATES:
+            if baud != self.baudrate:
+                self._set_local_baud(baud)
+            if await self.command("AT", 300) is not None:
+                return baud
+        self._set_local_baud(BAUDRATE)
+        return None
+
+    async def throughput_test(self, rounds=10):
+        """
+        Meet de effectieve ontvangstsnelheid met AT+GMR-rondes en rapporteer ook de
+        tot nu toe gehaalde HTTP-payloadsnelheid. Retourneert bytes per seconde.
+        """
+        rx_start = self.rx_bytes
+        start = time.ticks_ms()
+        for _ in range(rounds):
+            await self.command("AT+GMR", 500)
+        elapsed = max(1, time.ticks_diff(time.ticks_ms(), start))
+        rate = (self.rx_bytes - rx_start) * 1000 // elapsed
+        payload = self.tx_payload * 1000 // self.tx_ms if self.tx_ms else 0
+        debug_print("UART {} baud: {} B/s ontvangen ({} rondes in {} ms), HTTP-payload {} B/s".format(
+            self.baudrate, rate, rounds, elapsed, payload))
+        return rate
+
+    async def setup(self):
+        if await self._find_baud() is None:
+            debug_print("ESP8266 reageert niet op AT")
+        await self.negotiate_baud()
+        await self.throughput_test()
+        await self.command("AT+CWMODE=2", SETUP_TIMEOUT_MS)
+        await self.command('AT+CWSAP="Hackbat_AP","hackbat123",5,3', SETUP_TIMEOUT_MS)
+        await self.command("AT+CIPMUX=1")
+        await self.command("AT+CIPSERVER=1,80", SETUP_TIMEOUT_MS)
+        # Vangnet: de ESP8266 sluit zelf verbindingen die veel langer stil zijn dan onze keep-alive
+        # Ruim genoeg dat de ESP een wachtende /events-long-poll niet zelf afbreekt
+        await self.command("AT+CIPSTO={}".format((LONGPOLL_MAX_MS + KEEPALIVE_IDLE_MS) // 1000))
         print("ESP8266 is nu een Access Point met een webserver!")
         Display.update_status("ESP8266 gestart")
 
-    def ask_ip(self):
-        response = self.send_command("AT+CIFSR", self.WEB_DELAY)
+    async def ask_ip(self):
+        response = await self.command("AT+CIFSR")
         debug_print("AT+CIFSR response:\n" + str(response))
         if response:
             for line in response.splitlines():
@@ -66,111 +542,49 @@ class WiFiChip:
         Display.show_ip(self.ap_ip)
         return self.ap_ip
 
-    def process_uart(self, dummy):
-        print("process_uart called with arg =", dummy)
-        self.uart_proc_scheduled = False
-        if self.uart_busy:
-            debug_print("UART busy, skipping processing.")
-            return
-        self.uart_busy = True
-
+    async def process_request(self, link_id, method, path, headers, body, keep_alive=False):
         try:
-            # Blijf data lezen en bufferen
-            while self.uart.any():
-                chunk = self.uart.read()
-                if not chunk:
-                    break
-                debug_print("Read chunk of length: " + str(len(chunk)))
-                self.http_buffer += chunk
-
-            debug_print("Current HTTP buffer (raw): " + repr(self.http_buffer))
-            
-            # Als er geen 'GET ' of 'POST ' in de buffer zit en de buffer kleiner is dan 50 bytes, wacht op meer data.
-            if (b"GET " not in self.http_buffer and b"POST " not in self.http_buffer) and len(self.http_buffer) < 50:
-                debug_print("Not enough data to parse, waiting for next chunk.")
-                self.uart_busy = False
-                return
-
-            try:
-                tekst = self.http_buffer.decode()
-            except Exception as e:
-                debug_print("Error decoding buffer: " + str(e))
-                self.http_buffer = b""
-                self.uart_busy = False
-                return
-            print("Complete request:\n", tekst)
-            # Reset de buffer na decodering
-            self.http_buffer = b""
-
-            # Splits de regels
-            lines = tekst.splitlines()
-            ipd_line = None
-            request_line = None
-
-            # Zoek eerst de +IPD regel
-            for l in lines:
-                if l.startswith("+IPD"):
-                    ipd_line = l
-                    break
-
-            # Zoek naar een regel die "GET " of "POST " bevat, ook als dat niet aan het begin staat.
-            for l in lines:
-                if "GET " in l or "POST " in l:
-                    # Neem het deel vanaf "GET " of "POST "
-                    idx = l.find("GET ")
-                    if idx == -1:
-                        idx = l.find("POST ")
-                    request_line = l[idx:]
-                    break
-
-            if not ipd_line:
-                debug_print("No +IPD line found, ignoring request.")
-                self.uart_busy = False
-                return
-            if not request_line:
-                debug_print("No request line found (no GET/POST).")
-                self.uart_busy = False
-                return
-
-            # Haal de link_id uit de +IPD regel
-            fields = ipd_line.split(',')
-            if len(fields) >= 2:
-                link_id = fields[1].split(":")[0].strip()
-            else:
-                link_id = "0"
-            debug_print("Extracted link ID: " + link_id)
-            print("Binnenkomende verbinding op link ID:", link_id)
+            print("Request op link {}: {} {}".format(link_id, method, path))
+            link = self._links.get(link_id)
+            if link is not None:
+                # Persistente verbindingen alleen zolang er niet te veel open staan
+                if keep_alive and not link.keep_alive:
+                    kept = sum(1 for l in self._links.values() if l.keep_alive)
+                    keep_alive = kept < MAX_KEEPALIVE_LINKS
+                link.keep_alive = keep_alive
             Display.show_connected()
 
-            # Parse de request regel, bijv. "GET / HTTP/1.1"
-        # Parse de request regel, bijvoorbeeld "GET /files HTTP/1.1"
-            parts = request_line.split()
-            if len(parts) < 2:
-                debug_print("Request line incomplete.")
-                self.uart_busy = False
-                return
-            method = parts[0]
-            path = parts[1]  # Bijvoorbeeld "/Packet.js", "/?action=mfkey32", "/files", of "/"
-
+            # path is bijvoorbeeld "/Packet.js", "/?action=mfkey32", "/files", of "/"
             if path == "/files":
-                self.serve_file_list(link_id)
+                await self.serve_file_list(link_id)
             elif path.endswith(".js"):
                 filename = path.lstrip("/")
-                self.serve_file(link_id, filename, content_type="application/javascript")
+                await self.serve_file(link_id, filename, content_type="application/javascript", headers=headers)
+            elif path == "/carddata" or path.startswith("/carddata?"):
+                await self.serve_carddata(link_id, headers, path)
+            elif path.startswith("/dump."):
+                await self.serve_dump(link_id, path)
+            elif path == "/events" or path.startswith("/events?"):
+                await self.serve_events(link_id, path)
+            elif path == "/jobs" or path.startswith("/jobs/"):
+                await self.serve_jobs(link_id, path)
+            elif path == "/debug/pn532":
+                await self.serve_pn532_benchmark(link_id)
+            elif "action=dump" in path:
+                await self.serve_dump_job(link_id)
             elif "action=mfkey32" in path:
-                self.serve_mfkey32(link_id)
+                await self.serve_mfkey32(link_id, headers, path)
             elif path == "/" or path.startswith("/?"):
-                self.serve_index(link_id)
+                await self.serve_index(link_id, headers)
             else:
-                self.send_not_found(link_id)
+                await self.send_not_found(link_id)
 
         except Exception as e:
-            debug_print("process_uart error: " + str(e))
-        self.uart_busy = False
+            debug_print("process_request error: " + str(e))
 
 
 
-    def serve_file_list(self, link_id):
+    async def serve_file_list(self, link_id):
         try:
             files = os.listdir("/")  # Of een ander pad indien nodig
             file_list = "<br>".join(files)
@@ -181,158 +595,231 @@ class WiFiChip:
                 "HTTP/1.1 200 OK\r\n"
                 "Content-Type: text/html\r\n"
                 "Content-Length: " + str(length) + "\r\n"
-                "Connection: close\r\n\r\n"
             )
-            full_response = response_header.encode("utf-8") + encoded
-            self.send_command(f"AT+CIPSEND={link_id},{len(full_response)}", self.WEB_DELAY)
-            self.uart.write(full_response)
-            time.sleep_ms(self.WEB_DELAY)
-            self.send_command(f"AT+CIPCLOSE={link_id}", self.WEB_DELAY)
-            print("Response verzonden naar client (bestandlijst).")
+            full_response = response_header.encode("utf-8") + self._connection(link_id) + encoded
+            self.respond(link_id, full_response)
+            print("Response in wachtrij voor client (bestandlijst).")
         except Exception as e:
             debug_print("serve_file_list error: " + str(e))
-            self.send_not_found(link_id)
+            await self.send_not_found(link_id)
 
 
 
 
-    def serve_file(self, link_id, filename, content_type="application/javascript"):
-        try:
-            print("Trying to serve file:", filename)
-            with open(filename, "r") as f:
-                file_content = f.read()
-            print("File content (first 100 chars):", file_content[:100])
-            encoded_content = file_content.encode("utf-8")
-            length = len(encoded_content)
-            response_header = (
-                "HTTP/1.1 200 OK\r\n"
-                f"Content-Type: {content_type}\r\n"
-                f"Content-Length: {length}\r\n"
-                "Connection: close\r\n\r\n"
-            )
-            header_bytes = response_header.encode("utf-8")
-            full_response = header_bytes + encoded_content
-
-            # Definieer een chunk size die ondersteund wordt (bijvoorbeeld 1024 bytes)
-            CHUNK_SIZE = 1024
-            total_len = len(full_response)
-            sent = 0
-            while sent < total_len:
-                chunk = full_response[sent:sent+CHUNK_SIZE]
-                # Verstuur de AT+CIPSEND opdracht met de lengte van de huidige chunk
-                self.send_command(f"AT+CIPSEND={link_id},{len(chunk)}", self.WEB_DELAY)
-                self.uart.write(chunk)
-                time.sleep_ms(self.WEB_DELAY)
-                sent += len(chunk)
-                print(f"Sent {sent} van {total_len} bytes")
-            
-            self.send_command(f"AT+CIPCLOSE={link_id}", self.WEB_DELAY)
-            print("Response verzonden naar client (file).")
-        except Exception as e:
-            debug_print("serve_file error: " + str(e))
-            self.send_not_found(link_id)
+    async def serve_file(self, link_id, filename, content_type="application/javascript", headers=None):
+        print("Trying to serve file:", filename)
+        encoding = ""
+        f = None
+        # Een met tools/pack_assets.py gemaakte .gz-versie scheelt het meeste UART-verkeer
+        if headers and "gzip" in headers.get("accept-encoding", ""):
+            try:
+                length = os.stat(filename + ".gz")[6]
+                f = open(filename + ".gz", "rb")
+                encoding = "Content-Encoding: gzip\r\n"
+            except OSError:
+                pass
+        if f is None:
+            try:
+                length = os.stat(filename)[6]
+                f = open(filename, "rb")
+            except OSError as e:
+                debug_print("serve_file error: " + str(e))
+                await self.send_not_found(link_id)
+                return
+        response_header = (
+            "HTTP/1.1 200 OK\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"{encoding}"
+            "Vary: Accept-Encoding\r\n"
+            f"Content-Length: {length}\r\n"
+        )
+        # Het bestand wordt in chunks vanuit de open handle verstuurd, om de beurt met andere verbindingen
+        self.respond(link_id, response_header.encode("utf-8"), self._connection(link_id), f)
+        print("Response in wachtrij voor client (file, {} bytes{}).".format(length, ", gzip" if encoding else ""))
 
 
 
 
-    def serve_index(self, link_id):
+    def send_template(self, link_id, filename, headers=None, **values):
+        """Verstuur een gecacht template; 304 als de browser dezelfde versie al heeft."""
+        parts, length, etag = templates.get(filename).render(**values)
+        if headers and headers.get("if-none-match") == etag:
+            self.respond(link_id, templates.not_modified(etag, self._connection(link_id)))
+            return
+        self.respond(link_id, templates.html_header(length, etag, self._connection(link_id)), *parts)
+
+    async def serve_index(self, link_id, headers=None):
         try:
-            with open("index.html", "r") as f:
-                page = f.read()
-            # Gebruik de functie om de HTML-tabel met volledige kaartdata te verkrijgen
+            # Alleen de snapshot lezen: de pagina wacht nooit op de PN532
             if self.nfc:
-                card_info_html = self.nfc.get_mfkey32_data_table()
+                card_info_html = self.nfc.snapshot.mfkey32_table()
             else:
                 card_info_html = "Geen kaartdata"
-            file_content = page.replace("{{CARD_INFO}}", card_info_html)
-            encoded = file_content.encode("utf-8")
-            length = len(encoded)
-            response_header = (
-                "HTTP/1.1 200 OK\r\n"
-                "Content-Type: text/html\r\n"
-                "Content-Length: " + str(length) + "\r\n"
-                "Connection: close\r\n\r\n"
-            )
-            full_response = response_header.encode("utf-8") + encoded
-            self.send_command(f"AT+CIPSEND={link_id},{len(full_response)}", self.WEB_DELAY)
-            self.uart.write(full_response)
-            time.sleep_ms(self.WEB_DELAY)
-            self.send_command(f"AT+CIPCLOSE={link_id}", self.WEB_DELAY)
-            print("Response verzonden naar client (index).")
+            self.send_template(link_id, "index.html", headers, CARD_INFO=card_info_html)
+            print("Response in wachtrij voor client (index).")
         except Exception as e:
             debug_print("serve_index error: " + str(e))
-            self.send_not_found(link_id)
+            await self.send_not_found(link_id)
 
 
-    def serve_mfkey32(self, link_id):
-        if self.nfc:
-            result = self.nfc.run_mfkey32()
+    async def serve_mfkey32(self, link_id, headers=None, path="/?action=mfkey32"):
+        """
+        Start het kraken. Een gesniffte volledige authenticatie kan meegegeven
+        worden voor mfkey64: ?action=mfkey32&nt=..&nr=..&ar=..&at=..[&uid=..].
+        """
+        import json
+        trace = {}
+        for pair in path.partition("?")[2].split("&"):
+            name, _, value = pair.partition("=")
+            if name in ("uid", "nt", "nr", "ar", "at"):
+                trace[name] = value
+        # De berekening duurt lang: als job starten en de voortgang via /jobs/<id> laten volgen
+        if self.nfc and self.jobs:
+            if "at" in trace:
+                self.nfc.set_mfkey64_trace(trace)
+            # Herladen van de pagina start geen tweede berekening voor dezelfde trace
+            snapshot = self.nfc.snapshot
+            job = self.jobs.submit("mfkey", self.nfc.mfkey_job, key=json.dumps([snapshot.mfkey64, snapshot.mfkey32]))
+            result = "Job {} gestart, voortgang: /jobs/{}".format(job.id, job.id)
         else:
             result = "NFC module not set"
         try:
-            with open("mfkey32.html", "r") as f:
-                page = f.read()
-            file_content = page.replace("{{MFKEY32_RESULT}}", str(result))
-            encoded = file_content.encode()
-            length = len(encoded)
-            response_header = (
-                "HTTP/1.1 200 OK\r\n"
-                "Content-Type: text/html\r\n"
-                f"Content-Length: {length}\r\n"
-                "Connection: close\r\n\r\n"
-            )
-            full_response = response_header + file_content
-            self.send_command(f"AT+CIPSEND={link_id},{len(full_response)}", self.WEB_DELAY)
-            self.uart.write(full_response.encode())
-            time.sleep_ms(self.WEB_DELAY)
-            self.send_command(f"AT+CIPCLOSE={link_id}", self.WEB_DELAY)
-            print("Response verzonden naar client (mfkey32).")
+            self.send_template(link_id, "mfkey32.html", headers, MFKEY32_RESULT=result)
+            print("Response in wachtrij voor client (mfkey32).")
         except Exception as e:
             debug_print("serve_mfkey32 error: " + str(e))
-            self.send_not_found(link_id)
+            await self.send_not_found(link_id)
 
 
-    def send_not_found(self, link_id):
-        body = "<html><body><h1>404 Not Found</h1></body></html>"
+    async def send_not_found(self, link_id):
+        body = b"<html><body><h1>404 Not Found</h1></body></html>"
         response_header = (
             "HTTP/1.1 404 Not Found\r\n"
             "Content-Type: text/html\r\n"
-            "Connection: close\r\n\r\n"
+            f"Content-Length: {len(body)}\r\n"
         )
-        full_response = response_header + body
-        self.send_command(f"AT+CIPSEND={link_id},{len(full_response)}", self.WEB_DELAY)
-        self.uart.write(full_response.encode())
-        time.sleep_ms(self.WEB_DELAY)
-        self.send_command(f"AT+CIPCLOSE={link_id}", self.WEB_DELAY)
+        self.respond(link_id, response_header.encode(), self._connection(link_id), body)
 
 
-    def uart_irq_handler(self, uart_instance):
-        if not self.uart_proc_scheduled:
-            self.uart_proc_scheduled = True
+    async def serve_jobs(self, link_id, path):
+        """/jobs: alle bewaarde jobs; /jobs/<id>: één job; /jobs/<id>/cancel: annuleren."""
+        if self.jobs is None:
+            await self.send_not_found(link_id)
+            return
+        parts = path.split("?")[0].strip("/").split("/")
+        if len(parts) == 1:
+            body = [job.to_dict() for job in self.jobs.jobs.values()]
+        else:
             try:
-                micropython.schedule(self.process_uart, 0)
-            except Exception as e:
-                debug_print("Scheduling failed: " + str(e))
-
+                job = self.jobs.get(int(parts[1]))
+            except ValueError:
+                job = None
+            if job is None:
+                await self.send_not_found(link_id)
+                return
+            if len(parts) > 2 and parts[2] == "cancel":
+                self.jobs.cancel(job.id)
+            body = job.to_dict()
+        self.send_json(link_id, body)
+
+    async def serve_pn532_benchmark(self, link_id):
+        """/debug/pn532: ms per PN532-commando met IRQ-lijn en met status pollen (PN532.benchmark_ready)."""
+        if self.nfc is None:
+            await self.send_not_found(link_id)
+            return
+        async with self.nfc.lock:
+            result = self.nfc.pn532.benchmark_ready()
+        self.send_json(link_id, result)
+
+    async def serve_dump_job(self, link_id):
+        """?action=dump: lees de kaart opnieuw uit (ook als er een dump op flash staat)."""
+        if self.nfc is None or self.jobs is None:
+            await self.send_not_found(link_id)
+            return
+        job = self.jobs.submit("dump", self.nfc.dump_job)
+        self.send_json(link_id, job.to_dict())
 
-    def serve_carddata(self, link_id):
+    def send_json(self, link_id, body):
         import json
-        data = self.nfc.get_mfkey32_data()
-        if data is None:
-            response_body = json.dumps({"error": "Geen kaartdata beschikbaar."})
-        else:
-            response_body = json.dumps(data)
-        encoded = response_body.encode("utf-8")
-        length = len(encoded)
+        encoded = json.dumps(body).encode("utf-8")
         response_header = (
             "HTTP/1.1 200 OK\r\n"
             "Content-Type: application/json\r\n"
-            f"Content-Length: {length}\r\n"
-            "Connection: close\r\n\r\n"
+            "Cache-Control: no-store\r\n"
+            f"Content-Length: {len(encoded)}\r\n"
         )
-        full_response = response_header.encode("utf-8") + encoded
-        self.send_command(f"AT+CIPSEND={link_id},{len(full_response)}", self.WEB_DELAY)
-        self.uart.write(full_response)
-        time.sleep_ms(self.WEB_DELAY)
-        self.send_command(f"AT+CIPCLOSE={link_id}", self.WEB_DELAY)
-
+        self.respond(link_id, response_header.encode("utf-8"), self._connection(link_id), encoded)
+
+    async def serve_dump(self, link_id, path):
+        """/dump.mfd, /dump.eml, /dump.nfc: de gecachte dump als download, blok voor blok gestreamd."""
+        fmt = path.split("?")[0][len("/dump."):]
+        image = await self.nfc.load_sectors() if self.nfc is not None else None
+        if image is None or fmt not in dumpexport.FORMATS:
+            await self.send_not_found(link_id)
+            return
+        export = dumpexport.DumpExport(image, fmt)
+        response_header = (
+            "HTTP/1.1 200 OK\r\n"
+            f"Content-Type: {export.content_type()}\r\n"
+            f"Content-Disposition: attachment; filename=\"{export.filename()}\"\r\n"
+            "Cache-Control: no-store\r\n"
+            f"Content-Length: {len(export)}\r\n"
+        )
+        self.respond(link_id, response_header.encode("utf-8"), self._connection(link_id), export)
+
+    async def serve_events(self, link_id, path):
+        """
+        Long-poll: /events?since=<seq>&timeout=<ms>. Het antwoord komt zodra er een
+        gebeurtenis na since is (of na de timeout, met een lege lijst). Zonder since
+        wordt vanaf nu gewacht; "gemist" zegt of er tussendoor al events vergeten zijn.
+        """
+        if self.nfc is None:
+            await self.send_not_found(link_id)
+            return
+        feed = self.nfc.events
+        since, timeout = feed.seq, LONGPOLL_MAX_MS
+        for pair in path.partition("?")[2].split("&"):
+            name, _, value = pair.partition("=")
+            try:
+                if name == "since":
+                    since = int(value)
+                elif name == "timeout":
+                    timeout = min(int(value), LONGPOLL_MAX_MS)
+            except ValueError:
+                pass
+        link = self._links.get(link_id)
+        events, missed = await feed.wait(since, max(0, timeout))
+        if self._links.get(link_id) is not link:
+            return  # Client is tijdens het wachten weggegaan
+        self.send_json(link_id, {"seq": feed.seq, "events": events, "gemist": missed})
+
+    async def serve_carddata(self, link_id, headers=None, path="/carddata"):
+        """
+        De kaart-snapshot als JSON; 304 zolang de versie niet veranderd is.
+        Ontbrekende sectoren worden eerst gelezen: alle, of met ?sector=<n> alleen die ene.
+        """
+        if self.nfc is None:
+            await self.send_not_found(link_id)
+            return
+        sectors = None
+        query = path.partition("?")[2]
+        if query.startswith("sector="):
+            try:
+                sectors = [int(query[7:].split("&")[0])]
+            except ValueError:
+                pass
+        await self.nfc.load_sectors(sectors)
+        snapshot = self.nfc.snapshot
+        etag = snapshot.etag()
+        if headers and headers.get("if-none-match") == etag:
+            self.respond(link_id, templates.not_modified(etag, self._connection(link_id)))
+            return
+        encoded = snapshot.json()
+        response_header = (
+            "HTTP/1.1 200 OK\r\n"
+            "Content-Type: application/json\r\n"
+            "Cache-Control: no-cache\r\n"
+            f"ETag: {etag}\r\n"
+            f"Content-Length: {len(encoded)}\r\n"
+        )
+        self.respond(link_id, response_header.encode("utf-8"), self._connection(link_id), encoded)